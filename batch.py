@@ -0,0 +1,154 @@
+"""
+    Batch simplification of many .ply files in parallel.
+
+    The manifest lists one file per line, either as JSON object
+        {"input": "scan.ply", "output": "scan_small.ply", "target": 0.1, "target_vertices": null, "max_error": null,
+         "preview": "scan.png"}
+    or as whitespace separated 'input output [target]'. Empty lines and lines starting with # are skipped. "preview"
+    is an optional PNG file with thumbnails before and after (see preview.py).
+
+    Jobs are started largest first in a pool of processes, and an idle process always takes the next job, so the
+    long jobs do not end up last. The memory of a job is estimated from the vertex and face counts in the header of
+    its file, and a job is only started if the estimates of the running jobs and its own fit into the memory limit
+    (a job larger than the limit runs alone). Results are returned as soon as their jobs finish.
+
+        python batch.py manifest.txt --workers 8 --results results.jsonl
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import data
+from simplify import simplify
+
+# estimated peak memory of a job, measured on the bunny scans with a margin
+JOB_BYTES = 64 * 2 ** 20
+BYTES_PER_VERTEX = 1024
+BYTES_PER_FACE = 3072
+
+
+def read_manifest(filename):
+    """ List of job dicts with 'input', 'output', targets and 'preview' (see simplify) from the manifest file. """
+    jobs = []
+    directory = os.path.dirname(os.path.abspath(filename))
+    with open(filename) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('{'):
+                job = json.loads(line)
+            else:
+                words = line.split()
+                if len(words) not in (2, 3):
+                    raise ValueError("Line %d of the manifest should be 'input output [target]'." % number)
+                job = {'input': words[0], 'output': words[1]}
+                if len(words) == 3:
+                    job['target'] = float(words[2])
+            if 'input' not in job:
+                raise ValueError("Line %d of the manifest has no input." % number)
+            # relative paths are relative to the manifest
+            for key in ('input', 'output', 'preview'):
+                if job.get(key) is not None:
+                    job[key] = os.path.join(directory, job[key])
+            jobs.append(job)
+    return jobs
+
+
+def estimate_memory(job):
+    """ Estimated peak memory of the job in bytes from the header of its input. Also stores the counts in the job. """
+    job['vertices'], job['faces'] = data.ply_counts(job['input'])
+    return JOB_BYTES + BYTES_PER_VERTEX * job['vertices'] + BYTES_PER_FACE * job['faces']
+
+
+def default_memory_limit():
+    """ Half of the physical memory, or 4 GB if it is not known. """
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // 2
+    except (ValueError, OSError, AttributeError):
+        return 4 * 2 ** 30
+
+
+def run_job(job):
+    """ Worker: simplifies one file. Returns dict with the job, sizes, time and stats, or the error. """
+    options = {key: job.get(key) for key in ('target', 'target_vertices', 'max_error', 'preview')}
+    result = {'input': job['input'], 'output': job.get('output'), 'faces': job.get('faces'), 'pid': os.getpid()}
+    start = time.perf_counter()
+    try:
+        stats = {}
+        triangulation, points = simplify(job['input'], job.get('output'), format=job.get('format', 'ascii'),
+                                         stats=stats, **options)
+        result.update(faces_after=len(triangulation), vertices_after=len(points), stats=stats)
+    except Exception as e:
+        result.update(error="%s: %s" % (type(e).__name__, e), traceback=traceback.format_exc())
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def batch_simplify(jobs, workers=None, memory_limit=None):
+    """ Simplifies the jobs (see read_manifest) in a pool of 'workers' processes.
+        Yields result dicts (see run_job) in the order the jobs finish. """
+    workers = workers or os.cpu_count() or 1
+    memory_limit = memory_limit or default_memory_limit()
+
+    pending = []
+    for job in jobs:
+        try:
+            pending.append((estimate_memory(job), job))
+        except (OSError, ValueError) as e:
+            yield {'input': job['input'], 'output': job.get('output'), 'error': "%s: %s" % (type(e).__name__, e)}
+    pending.sort(key=lambda item: item[0], reverse=True)
+
+    running = {}
+    used = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            # largest job that fits, or the largest one if nothing is running
+            while pending and len(running) < workers:
+                index = next((i for i, (memory, _) in enumerate(pending) if used + memory <= memory_limit), None)
+                if index is None:
+                    if running:
+                        break
+                    index = 0
+                memory, job = pending.pop(index)
+                running[executor.submit(run_job, job)] = memory
+                used += memory
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                used -= running.pop(future)
+                yield future.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simplifies the .ply files listed in the manifest in parallel.")
+    parser.add_argument("manifest", help="file with one job per line (see batch.py)")
+    parser.add_argument("--workers", type=int, help="number of processes (default: number of CPUs)")
+    parser.add_argument("--memory-limit", type=float, help="memory for all running jobs in MB (default: half of RAM)")
+    parser.add_argument("--results", help="JSON lines file for the results (default: standard output)")
+    args = parser.parse_args()
+
+    jobs = read_manifest(args.manifest)
+    memory_limit = int(args.memory_limit * 2 ** 20) if args.memory_limit else None
+    out = open(args.results, "w") if args.results else sys.stdout
+    start = time.perf_counter()
+    failed = 0
+    try:
+        for result in batch_simplify(jobs, args.workers, memory_limit):
+            if 'traceback' in result:
+                print(result.pop('traceback'), file=sys.stderr)
+            failed += 'error' in result
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print("%d files (%d failed) in %.2f s" % (len(jobs), failed, time.perf_counter() - start), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+"""
+    Benchmark of the surface simplification pipeline.
+
+    Runs every stage of the pipeline separately on the bundled bunny resolutions and on larger meshes made by
+    subdividing the full resolution bunny:
+    - get_triangulation: reading the .ply file,
+    - triangulation_to_graph: building the graph (CompactMesh or networkx.Graph) and the triangle index,
+    - initial_quadrics: quadrics of all vertices, edges and triangles,
+    - sort_edges: optimal positions, errors and the edge queue,
+    - contraction: the contraction loop,
+    - save_ply: compacting and writing the result.
+
+    Every input is measured in a separate process, so peak RSS belongs to that input only. Results are written
+    to a JSON file, which can be compared with an earlier run:
+
+        python benchmark.py --output new.json --compare old.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+import numpy as np
+
+import data, helpers, mesh
+from edge_contraction import triangle_index, initial_quadric_arrays, quadrics_dict, sort_edge_arrays, \
+    contract_edges, face_target
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BUNNY = os.path.join(ROOT, "bunny", "reconstruction", "bun_zipper")
+RESOLUTIONS = ["_res4", "_res3", "_res2", ""]
+
+STAGES = ["get_triangulation", "triangulation_to_graph", "initial_quadrics", "sort_edges", "contraction", "save_ply"]
+
+
+def subdivide(points, faces):
+    """ Splits every triangle into four by the midpoints of its edges. Returns new points and triangles. """
+    n = len(points)
+    edges = np.sort(faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1).astype(np.int64)
+    keys, index = np.unique(edges[:, 0] * n + edges[:, 1], return_inverse=True)
+    midpoints = (points[keys // n] + points[keys % n]) / 2
+
+    a, b, c = faces.T
+    ab, bc, ca = (index.reshape(-1, 3) + n).T
+    faces = np.concatenate([np.stack(t, axis=1) for t in ((a, ab, ca), (ab, b, bc), (ca, bc, c), (ab, bc, ca))])
+    return np.concatenate([points, midpoints]), faces
+
+
+def synthetic_inputs(levels, directory):
+    """ Writes the full resolution bunny subdivided 1, ..., 'levels' times to binary .ply files in 'directory'.
+        Returns list of (name, path). """
+    points, triangulation = data.get_triangulation(BUNNY + ".ply")
+    points, faces = np.array(points), np.array(triangulation)
+    inputs = []
+    for level in range(1, levels + 1):
+        points, faces = subdivide(points, faces)
+        name = "bun_zipper_sub%d" % level
+        path = os.path.join(directory, name + ".ply")
+        data.save_ply(path, faces, points, format='binary_little_endian')
+        inputs.append((name, path))
+    return inputs
+
+
+def peak_rss_mb():
+    """ Peak resident set size of this process in MB. """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 ** 2 if platform.system() == "Darwin" else 1024)
+
+
+def run_pipeline(path, target_ratio=0.1, graph_type="mesh", output_format="binary_little_endian", profile=False):
+    """ Runs the whole pipeline on one file and times every stage. Returns dict of results.
+        With 'profile' the phases of the contraction loop are timed as well (see contract_edges). """
+    seconds = {}
+    counters = {}
+    phases = {} if profile else None
+
+    def timed(stage, function, *args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        seconds[stage] = time.perf_counter() - start
+        return result
+
+    points, triangulation = timed("get_triangulation", data.get_triangulation, path)
+    n_vertices, n_faces = len(points), len(triangulation)
+
+    def build_graph():
+        if graph_type == "mesh":
+            graph = mesh.triangulation_to_mesh(triangulation, points)
+        else:
+            graph = helpers.triangulation_to_graph(triangulation, points)
+        return (graph,) + triangle_index(graph, triangulation)
+
+    graph, triangles, incidence, faces = timed("triangulation_to_graph", build_graph)
+
+    def quadrics():
+        arrays = initial_quadric_arrays(points, faces)
+        return arrays, quadrics_dict(graph, faces, *arrays)
+
+    (vertex_q, edges, _, _), error = timed("initial_quadrics", quadrics)
+    queue, edge_coordinate = timed("sort_edges", sort_edge_arrays, edges, vertex_q, points)
+
+    collapses = timed("contraction", contract_edges, graph, triangles, incidence, points, error, queue,
+                      edge_coordinate, target_faces=face_target(n_faces, target_ratio=target_ratio), stats=counters,
+                      timers=phases)
+    counters.update(queue.stats())
+
+    result = list(triangles) if triangles is not None else graph.triangles()
+    with tempfile.TemporaryDirectory() as directory:
+        timed("save_ply", data.save_ply, os.path.join(directory, "out.ply"), result, points, format=output_format,
+              compact=True)
+
+    return {
+        "vertices": n_vertices,
+        "faces": n_faces,
+        "faces_after": len(result),
+        "collapses": collapses,
+        "collapses_per_second": collapses / seconds["contraction"] if seconds["contraction"] > 0 else None,
+        "seconds": seconds,
+        "contraction_phases": phases,
+        "counters": counters,
+        "total_seconds": sum(seconds.values()),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def measure(name, path, **options):
+    """ Runs run_pipeline in a new process, so the peak RSS is not shared with other inputs. """
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        result = executor.submit(run_pipeline, path, **options).result()
+    return dict(name=name, file=os.path.relpath(path, ROOT) if path.startswith(ROOT) else name + ".ply", **result)
+
+
+def scaling_exponents(cases):
+    """ Slope of log(time) against log(number of triangles) for every stage and the total, fitted by least squares
+        over all cases. An exponent of 1 means linear scaling. """
+    exponents = {}
+    for stage in STAGES + ["total"]:
+        pairs = [(case["faces"], case["total_seconds"] if stage == "total" else case["seconds"][stage])
+                 for case in cases]
+        pairs = [(f, s) for f, s in pairs if f > 0 and s > 0]
+        if len(set(f for f, _ in pairs)) < 2:
+            exponents[stage] = None
+            continue
+        x, y = np.log([f for f, _ in pairs]), np.log([s for _, s in pairs])
+        exponents[stage] = float(np.polyfit(x, y, 1)[0])
+    return exponents
+
+
+def environment():
+    """ Information about the machine and code the benchmark was run with. """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(old, new):
+    """ Ratios new / old of stage times, total time and peak RSS for cases present in both results.
+        Returns dict: case name -> dict of ratios. """
+    old_cases = {case["name"]: case for case in old["cases"]}
+    ratios = {}
+    for case in new["cases"]:
+        before = old_cases.get(case["name"])
+        if before is None:
+            continue
+        values = {stage: (case["seconds"][stage], before["seconds"].get(stage)) for stage in STAGES}
+        values["total"] = (case["total_seconds"], before["total_seconds"])
+        values["peak_rss_mb"] = (case["peak_rss_mb"], before["peak_rss_mb"])
+        ratios[case["name"]] = {key: a / b if b else None for key, (a, b) in values.items()}
+    return ratios
+
+
+def print_table(cases):
+    print("%-18s %9s %9s" % ("case", "faces", "rss MB") + "".join(" %12s" % s[:12] for s in STAGES) + " %10s"
+          % "coll/s")
+    for case in cases:
+        print("%-18s %9d %9.1f" % (case["name"], case["faces"], case["peak_rss_mb"])
+              + "".join(" %12.3f" % case["seconds"][s] for s in STAGES)
+              + " %10.0f" % (case["collapses_per_second"] or 0))
+
+
+def print_comparison(ratios):
+    keys = STAGES + ["total", "peak_rss_mb"]
+    print("%-18s" % "new / old" + "".join(" %12s" % k[:12] for k in keys))
+    for name, values in ratios.items():
+        print("%-18s" % name + "".join(" %12s" % ("-" if values[k] is None else "%.2f" % values[k]) for k in keys))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the surface simplification pipeline.")
+    parser.add_argument("--output", default="benchmark.json", help="JSON file for the results")
+    parser.add_argument("--compare", help="JSON file of an earlier run to compare with")
+    parser.add_argument("--subdivide", type=int, default=1,
+                        help="number of subdivision levels of the full resolution bunny to add (0 for none)")
+    parser.add_argument("--target-ratio", type=float, default=0.1, help="fraction of triangles to keep")
+    parser.add_argument("--graph", choices=["mesh", "networkx"], default="mesh", help="graph used by the contraction")
+    parser.add_argument("--format", default="binary_little_endian", help="format of the written .ply files")
+    parser.add_argument("--profile", action="store_true", help="time the phases of the contraction loop")
+    args = parser.parse_args()
+
+    options = {"target_ratio": args.target_ratio, "graph_type": args.graph, "output_format": args.format,
+               "profile": args.profile}
+    cases = []
+    with tempfile.TemporaryDirectory() as directory:
+        inputs = [("bun_zipper" + res, BUNNY + res + ".ply") for res in RESOLUTIONS]
+        inputs += synthetic_inputs(args.subdivide, directory)
+        for name, path in inputs:
+            cases.append(measure(name, path, **options))
+            print("%s: %.2f s" % (name, cases[-1]["total_seconds"]))
+
+    results = {"environment": environment(), "options": options, "cases": cases,
+               "scaling": scaling_exponents(cases)}
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print()
+    print_table(cases)
+    print("scaling exponents:", ", ".join("%s %.2f" % (k, v) for k, v in results["scaling"].items() if v is not None))
+
+    if args.compare:
+        with open(args.compare) as f:
+            print()
+            print_comparison(compare(json.load(f), results))
+
+
+if __name__ == '__main__':
+    main()
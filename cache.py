@@ -0,0 +1,106 @@
+"""
+    On-disk cache of the initial arrays of edge contraction.
+
+    Quadrics of vertices, edges and triangles, the edges and their optimal positions and errors depend only on the
+    points and triangles of the input. They are saved as .npy files in a directory named by a hash of the points,
+    the triangles, the names of the arrays and ALGORITHM_VERSION, and loaded memory-mapped, so a repeated run with
+    other targets goes straight to the contraction loop. The packed quadric modes of edge_contraction keep only the
+    packed vertex quadrics (PACKED_ARRAYS) in entries of their own.
+
+    The cache keeps at most 'max_bytes' of files. Using an entry updates the modification time of its directory and
+    the least recently used entries are removed first when the cache is full.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+import helpers
+
+# change when the initial quadrics, positions or errors are computed differently
+ALGORITHM_VERSION = 1
+
+ARRAYS = ('vertex_q', 'edges', 'edge_q', 'face_q', 'positions', 'errors')
+PACKED_ARRAYS = ('vertex_q_packed', 'edges', 'positions', 'errors')
+
+
+class QuadricCache:
+
+    def __init__(self, directory, max_bytes=2 ** 30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, points, faces, names=ARRAYS):
+        """ Hash of the points, triangles, names of the arrays and version of the algorithm. """
+        digest = hashlib.sha256()
+        digest.update(("%d %r %s" % (ALGORITHM_VERSION, helpers.SINGULAR_TOLERANCE, ' '.join(sorted(names)))).encode())
+        for array in (np.asarray(points, dtype=np.float64), np.asarray(faces, dtype=np.int64)):
+            digest.update(str(array.shape).encode())
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+    def load(self, points, faces, names=ARRAYS):
+        """ Dict of the cached arrays 'names' (ARRAYS or PACKED_ARRAYS) for the points and triangles, or None if they
+            are not cached. """
+        path = os.path.join(self.directory, self.key(points, faces, names))
+        try:
+            arrays = {name: np.asarray(np.load(os.path.join(path, name + '.npy'), mmap_mode='r')) for name in names}
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return arrays
+
+    def store(self, points, faces, arrays):
+        """ Saves dict of arrays (ARRAYS or PACKED_ARRAYS) for the points and triangles and removes old entries if
+            needed. """
+        names = tuple(arrays)
+        path = os.path.join(self.directory, self.key(points, faces, names))
+        if os.path.isdir(path):
+            return
+        # written to a temporary directory first, so other processes never see an incomplete entry
+        temporary = tempfile.mkdtemp(dir=self.directory, prefix='.tmp-')
+        try:
+            for name in names:
+                np.save(os.path.join(temporary, name + '.npy'), arrays[name])
+            os.rename(temporary, path)
+        except OSError:
+            shutil.rmtree(temporary, ignore_errors=True)
+            if not os.path.isdir(path):
+                raise
+        self.evict()
+
+    def entries(self):
+        """ List of (last use, size in bytes, path) of the cached entries. """
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith('.') or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+                entries.append((os.path.getmtime(path), size, path))
+            except OSError:
+                # removed by another process in the meantime
+                continue
+        return entries
+
+    def evict(self):
+        """ Removes the least recently used entries until the cache is not larger than max_bytes. """
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,176 @@
+"""
+    Checkpoints of long edge contraction runs.
+
+    The whole state of contract_edges is saved as arrays (no pickled objects) to one .npz file:
+    - the graph: arrays of CompactMesh (see CompactMesh.arrays) or nodes, edges and triangles of networkx.Graph,
+    - all points, with the new points of the contractions,
+    - the quadrics: keys and (K, 4, 4) values of the dict, split by the number of vertices, or packed VertexQuadrics,
+    - the queue (see EdgeQueue.arrays) and the optimal positions of the edges,
+    - the counters of the loop and the targets.
+
+    The file is written to a temporary file in the same directory and renamed over the previous checkpoint, so a run
+    killed while writing leaves the previous one. resume builds the state again and continues with the same
+    contractions as the uninterrupted run: the order of the queue depends only on its entries and the quadrics are
+    summed in sorted order, so the order of the sets built again does not matter.
+
+        edge_contraction(graph, triangulation, points, checkpoint=Checkpoint('bunny.npz', seconds=60))
+        ...
+        triangulation, points = resume('bunny.npz')
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from edge_contraction import COUNTERS, contract_edges, contraction_result
+from edge_queue import EdgeQueue
+from helpers import triangle_incidence
+from mesh import CompactMesh
+from quadrics import VertexQuadrics
+
+# change when the saved arrays change
+FORMAT_VERSION = 1
+
+
+class Checkpoint:
+    """ Saves the state of edge_contraction (see its 'checkpoint' argument) to 'filename' after every 'every'
+        contractions and after 'seconds' since the last save, whichever comes first (None turns either off). """
+
+    def __init__(self, filename, every=None, seconds=60.0):
+        self.filename = filename
+        self.every = every
+        self.seconds = seconds
+        self.saves = 0
+        self.save_seconds = 0.0
+        self.last_collapses = 0
+        self.last_time = time.perf_counter()
+
+    def due(self, collapses):
+        """ Check if the state after 'collapses' contractions should be saved. """
+        if self.every is not None and collapses - self.last_collapses >= self.every:
+            return True
+        return self.seconds is not None and time.perf_counter() - self.last_time >= self.seconds
+
+    def save(self, graph, triangles, points, quadrics, queue, edge_coordinate, counters, options):
+        """ Writes the state of contract_edges (its arguments, 'counters' like its stats and 'options' with the
+            targets and locked vertices). """
+        start = time.perf_counter()
+        write_snapshot(self.filename, snapshot(graph, triangles, points, quadrics, queue, edge_coordinate, counters,
+                                               options))
+        self.saves += 1
+        self.last_collapses = counters['collapses']
+        self.last_time = time.perf_counter()
+        self.save_seconds += self.last_time - start
+
+
+def snapshot(graph, triangles, points, quadrics, queue, edge_coordinate, counters, options):
+    """ Dict of arrays with the state of contract_edges, see Checkpoint.save. """
+    arrays = {'version': np.array(FORMAT_VERSION)}
+
+    if isinstance(graph, CompactMesh):
+        arrays.update(prefixed('mesh_', graph.arrays()))
+    else:
+        arrays['graph_nodes'] = np.array(list(graph.nodes()), dtype=np.int64)
+        arrays['graph_edges'] = np.array(list(graph.edges()), dtype=np.int64).reshape(-1, 2)
+        arrays['graph_triangles'] = np.array(list(triangles), dtype=np.int64).reshape(-1, 3)
+
+    arrays['points'] = np.array(points, dtype=float).reshape(-1, 3)
+
+    if isinstance(quadrics, VertexQuadrics):
+        arrays['quadrics_packed'] = quadrics.packed[:len(quadrics)]
+    else:
+        for size in (1, 2, 3):
+            keys = [key for key in quadrics if len(key) == size]
+            arrays['quadrics_keys%d' % size] = np.array(keys, dtype=np.int64).reshape(-1, size)
+            values = np.array([quadrics[key] for key in keys], dtype=float)
+            arrays['quadrics_values%d' % size] = values.reshape(-1, 4, 4)
+
+    arrays.update(prefixed('queue_', queue.arrays()))
+    arrays['coordinate_edges'] = np.array(list(edge_coordinate), dtype=np.int64).reshape(-1, 2)
+    arrays['coordinate_positions'] = np.array(list(edge_coordinate.values()), dtype=float).reshape(-1, 3)
+
+    arrays['counters'] = np.array([counters[key] for key in COUNTERS], dtype=np.int64)
+    arrays['max_error'] = np.array(np.nan if counters['max_error'] is None else counters['max_error'])
+    arrays['targets'] = np.array([-1 if options[key] is None else options[key]
+                                  for key in ('target_faces', 'target_vertices')], dtype=np.int64)
+    arrays['target_error'] = np.array(np.nan if options['max_error'] is None else options['max_error'])
+    arrays['locked'] = np.array(sorted(options['locked']), dtype=np.int64)
+    return arrays
+
+
+def write_snapshot(filename, arrays):
+    """ Writes the arrays to the .npz file 'filename' atomically. """
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)), prefix='.tmp-')
+    try:
+        with os.fdopen(descriptor, 'wb') as f:
+            np.savez(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, filename)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+def resume(filename, compact=True, stats=None, timers=None, progress=None, progress_every=1000, topology=None,
+           checkpoint=None):
+    """ Continues the edge_contraction run saved in the checkpoint 'filename' and returns its triangles and points
+        like edge_contraction. The other arguments are as in edge_contraction ('checkpoint' keeps saving the state of
+        the continued run, 'stats' counts the whole run). """
+    with np.load(filename, allow_pickle=False) as saved:
+        arrays = dict(saved)
+    if int(arrays['version']) != FORMAT_VERSION:
+        raise ValueError("Checkpoint {} has format version {}, expected {}.".format(
+            filename, int(arrays['version']), FORMAT_VERSION))
+
+    if 'mesh_faces' in arrays:
+        graph = CompactMesh.from_arrays(unprefixed('mesh_', arrays))
+        triangles, incidence = None, graph.incidence()
+    else:
+        import networkx as nx
+        graph = nx.Graph()
+        graph.add_nodes_from(arrays['graph_nodes'].tolist())
+        graph.add_edges_from(map(tuple, arrays['graph_edges'].tolist()))
+        triangles = set(map(tuple, arrays['graph_triangles'].tolist()))
+        incidence = triangle_incidence(triangles)
+
+    points = arrays['points'].tolist()
+
+    if 'quadrics_packed' in arrays:
+        quadrics = VertexQuadrics.from_packed(arrays['quadrics_packed'])
+    else:
+        quadrics = {}
+        for size in (1, 2, 3):
+            keys = map(tuple, arrays['quadrics_keys%d' % size].tolist())
+            quadrics.update(zip(keys, arrays['quadrics_values%d' % size]))
+
+    queue = EdgeQueue.from_arrays(unprefixed('queue_', arrays))
+    edge_coordinate = dict(zip(map(tuple, arrays['coordinate_edges'].tolist()), arrays['coordinate_positions']))
+
+    counters = dict(zip(COUNTERS, arrays['counters'].tolist()))
+    counters['max_error'] = None if np.isnan(arrays['max_error']) else float(arrays['max_error'])
+    target_faces, target_vertices = (None if t < 0 else t for t in arrays['targets'].tolist())
+    max_error = None if np.isnan(arrays['target_error']) else float(arrays['target_error'])
+
+    if topology is not None:
+        topology.start(list(triangles) if triangles is not None else graph.triangles())
+    if checkpoint is not None:
+        checkpoint.last_collapses = counters['collapses']
+
+    contract_edges(graph, triangles, incidence, points, quadrics, queue, edge_coordinate,
+                   target_faces=target_faces, target_vertices=target_vertices, max_error=max_error,
+                   locked=set(arrays['locked'].tolist()), stats=stats, timers=timers, progress=progress,
+                   progress_every=progress_every, topology=topology, checkpoint=checkpoint, counters=counters)
+    if stats is not None:
+        stats.update(queue.stats())
+    return contraction_result(graph, triangles, points, compact)
+
+
+def prefixed(prefix, arrays):
+    return {prefix + name: array for name, array in arrays.items()}
+
+
+def unprefixed(prefix, arrays):
+    return {name[len(prefix):]: array for name, array in arrays.items() if name.startswith(prefix)}
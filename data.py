@@ -1,7 +1,17 @@
 """
     Read triangulation from a .ply file.
 """
-from helpers import sorted_tuple
+import io
+import mmap
+import numpy as np
+from helpers import compact_vertices
+
+PLY_TYPES = {
+    'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+    'short': 'i2', 'int16': 'i2', 'ushort': 'u2', 'uint16': 'u2',
+    'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+    'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8',
+}
 
 
 def get_triangulation(file):
@@ -9,37 +19,273 @@ def get_triangulation(file):
         Ex.: points = [[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [0.0, 0.0, 1.0]],
              triangulation = [(0, 1, 2)]
     """
-    points = []
-    triangulation = set()
+    points, faces = read_ply(file)
+    triangulation = unique_rows(np.sort(faces, axis=1))
+    return points.tolist(), list(zip(*triangulation.T.tolist()))
+
+
+def read_ply(file):
+    """ Reads ascii or binary (little or big endian) .ply file.
+        Returns (N, 3) float array of vertex coordinates and (F, 3) int array of triangles.
+        Vertices may have any properties as long as they include x, y and z. Polygons with more than three vertices
+        are split into triangles around their first vertex.
+    """
+    with open(file, "rb") as f:
+        header, elements = read_header(f)
+        f.seek(0)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            if header['format'] == 'ascii':
+                data = read_ascii(buffer, header['size'], elements)
+            else:
+                data = read_binary(buffer, header['size'], elements, '<' if header['format'] == 'binary_little_endian' else '>')
+            # copy the arrays out of the mapped file before it is closed
+            points, faces = points_and_faces(data)
+            del data
+    return points, faces
+
+
+def points_and_faces(data):
+    vertices = data['vertex']
+    points = np.stack([vertices[name] for name in ('x', 'y', 'z')], axis=1).astype(float)
 
-    with open(file, "r") as f:
+    faces = np.zeros((0, 3), dtype=np.int32)
+    if 'face' in data:
+        face_data = data['face']
+        name = next((n for n in ('vertex_indices', 'vertex_index') if n in face_data), None)
+        if name is None:
+            name = next(n for n in face_data if not n.endswith('_count'))
+        faces = triangulate(face_data[name])
+    return points, faces
 
-        # skip header
+
+def ply_counts(file):
+    """ Number of vertices and faces of a .ply file read from its header only. """
+    with open(file, "rb") as f:
+        _, elements = read_header(f)
+    counts = {name: count for name, count, _ in elements}
+    return counts.get('vertex', 0), counts.get('face', 0)
+
+
+def read_header(f):
+    """ Returns dict with 'format' and 'size' of the header in bytes and list of elements.
+        Every element is a tuple (name, count, properties), property is (name, type) or (name, count type, type)
+        for lists. """
+    line = f.readline()
+    if line.strip() != b'ply':
+        raise ValueError("Not a .ply file.")
+
+    header = {}
+    elements = []
+    while True:
         line = f.readline()
+        if not line:
+            raise ValueError("Missing end_header in .ply file.")
+        words = line.decode('ascii').split()
+        if not words or words[0] in ('comment', 'obj_info'):
+            continue
+        if words[0] == 'end_header':
+            break
+        if words[0] == 'format':
+            if words[1] not in ('ascii', 'binary_little_endian', 'binary_big_endian'):
+                raise ValueError("Unknown .ply format: {}".format(words[1]))
+            header['format'] = words[1]
+        elif words[0] == 'element':
+            elements.append((words[1], int(words[2]), []))
+        elif words[0] == 'property':
+            if words[1] == 'list':
+                elements[-1][2].append((words[4], PLY_TYPES[words[2]], PLY_TYPES[words[3]]))
+            else:
+                elements[-1][2].append((words[2], PLY_TYPES[words[1]]))
+
+    header['size'] = f.tell()
+    return header, elements
+
 
-        while line != "end_header\n":
-            line = f.readline()
+def read_ascii(buffer, offset, elements):
+    """ Parses all elements of an ascii .ply file. Each element block is parsed with one call to np.fromstring. """
+    lines = buffer[offset:].split(b'\n')
+    data = {}
+    start = 0
+    try:
+        for name, count, properties in elements:
+            values = np.fromstring(b' '.join(lines[start:start + count]), sep=' ')
+            start += count
+            data[name] = element_from_values(values, count, properties)
+    except ValueError:
+        return read_ascii_lines(lines, elements)
+    return data
 
-        for line in f.readlines():
-            data = line.strip().split(" ")
 
-            # lines of form x, y, z, and some data we don't need
-            if len(data) == 5:
-                points.append([float(x) for x in data[:3]])
+def read_ascii_lines(lines, elements):
+    """ Slow fallback for ascii files that do not match their header (e.g. have fewer lines than declared).
+        Every element takes the following lines that have the right number of values for it. """
+    data = {}
+    lines = iter([line.split() for line in lines if line.strip()])
+    line = next(lines, None)
+    for name, count, properties in elements:
+        records = []
+        while line is not None and len(records) < count and record_fits(line, properties):
+            records.append([float(x) for x in line])
+            line = next(lines, None)
+        values = np.array([x for record in records for x in record])
+        data[name] = element_from_values(values, len(records), properties)
+    return data
 
-            # lines of form 3, i, j, k (indices of points)
-            elif len(data) == 4 and data[0] == '3':
-                triangulation.add(sorted_tuple(*[int(i) for i in data[1:]]))
 
-    return points, list(triangulation)
+def record_fits(words, properties):
+    position = 0
+    for p in properties:
+        if position >= len(words):
+            return False
+        position += 1 + int(float(words[position])) if len(p) == 3 else 1
+    return position == len(words)
 
-def export_ply(triangulation, points):
-    triangulation = [t for t in triangulation
-                     if len(t) == 3]
-    data = """ply
-format ascii 1.0           
+
+def element_from_values(values, count, properties):
+    """ Splits flat array of values of 'count' records into arrays of properties. Raises ValueError if the values
+        do not make exactly 'count' records (read_ascii then falls back to read_ascii_lines). """
+    if all(len(p) == 2 for p in properties):
+        values = values.reshape(count, len(properties))
+        return {p[0]: values[:, i] for i, p in enumerate(properties)}
+
+    # with list properties assume every list is as long as the first one
+    lengths, position = [], 0
+    for p in properties:
+        length = int(values[position]) if len(p) == 3 and len(values) else 0
+        lengths.append(length)
+        position += 1 + length if len(p) == 3 else 1
+    if count * position == len(values):
+        values = values.reshape(count, position)
+        if all(np.all(values[:, start] == length) for start, length in list_starts(properties, lengths)):
+            return split_columns(values, properties, lengths)
+
+    # lists of different lengths: walk through the records one by one
+    result = {p[0]: [] for p in properties}
+    position = 0
+    for _ in range(count):
+        for p in properties:
+            if position >= len(values):
+                raise ValueError("Fewer values than {} records.".format(count))
+            if len(p) == 3:
+                length = int(values[position])
+                result[p[0]].append(values[position + 1:position + 1 + length])
+                position += 1 + length
+            else:
+                result[p[0]].append(values[position])
+                position += 1
+    if position != len(values):
+        raise ValueError("Values do not match {} records.".format(count))
+    return result
+
+
+def list_starts(properties, lengths):
+    """ Positions of the counts of list properties in a record with lists of given lengths. """
+    position = 0
+    for p, length in zip(properties, lengths):
+        if len(p) == 3:
+            yield position, length
+            position += 1 + length
+        else:
+            position += 1
+
+
+def split_columns(values, properties, lengths):
+    result = {}
+    position = 0
+    for p, length in zip(properties, lengths):
+        if len(p) == 3:
+            result[p[0]] = values[:, position + 1:position + 1 + length]
+            position += 1 + length
+        else:
+            result[p[0]] = values[:, position]
+            position += 1
+    return result
+
+
+def read_binary(buffer, offset, elements, endian):
+    """ Reads all elements of a binary .ply file with np.frombuffer. """
+    data = {}
+    for name, count, properties in elements:
+        if all(len(p) == 2 for p in properties):
+            dtype = np.dtype([(p[0], endian + p[1]) for p in properties])
+            records = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset)
+            data[name] = {p[0]: records[p[0]] for p in properties}
+            offset += count * dtype.itemsize
+        else:
+            data[name], offset = read_binary_lists(buffer, offset, count, properties, endian)
+    return data
+
+
+def read_binary_lists(buffer, offset, count, properties, endian):
+    """ Reads element with list properties. If all lists are as long as the first ones, records have fixed size and
+        the whole element is read at once, otherwise record by record. """
+    lengths, position = [], offset
+    for p in properties:
+        if len(p) == 3:
+            length = int(np.frombuffer(buffer, dtype=endian + p[1], count=1, offset=position)[0]) if count else 0
+            lengths.append(length)
+            position += np.dtype(p[1]).itemsize + length * np.dtype(p[2]).itemsize
+        else:
+            lengths.append(0)
+            position += np.dtype(p[1]).itemsize
+
+    fields = []
+    for p, length in zip(properties, lengths):
+        if len(p) == 3:
+            fields.append((p[0] + '_count', endian + p[1]))
+            fields.append((p[0], endian + p[2], (length,)))
+        else:
+            fields.append((p[0], endian + p[1]))
+    dtype = np.dtype(fields)
+
+    if offset + count * dtype.itemsize <= len(buffer):
+        records = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset)
+        if all(np.all(records[p[0] + '_count'] == length) for p, length in zip(properties, lengths) if len(p) == 3):
+            return {p[0]: records[p[0]] for p in properties}, offset + count * dtype.itemsize
+
+    result = {p[0]: [] for p in properties}
+    for _ in range(count):
+        for p in properties:
+            if len(p) == 3:
+                length = int(np.frombuffer(buffer, dtype=endian + p[1], count=1, offset=offset)[0])
+                offset += np.dtype(p[1]).itemsize
+                result[p[0]].append(np.frombuffer(buffer, dtype=endian + p[2], count=length, offset=offset))
+                offset += length * np.dtype(p[2]).itemsize
+            else:
+                result[p[0]].append(np.frombuffer(buffer, dtype=endian + p[1], count=1, offset=offset)[0])
+                offset += np.dtype(p[1]).itemsize
+    return result, offset
+
+
+def triangulate(polygons):
+    """ (F, 3) int array of triangles from (F, k) array or list of polygons. Polygons are split into a fan of
+        triangles around their first vertex, lines and points are dropped. """
+    if isinstance(polygons, np.ndarray) and polygons.ndim == 2:
+        polygons = polygons.astype(np.int64)
+        k = polygons.shape[1]
+        if k < 3:
+            return np.zeros((0, 3), dtype=np.int32)
+        fan = [np.stack([polygons[:, 0], polygons[:, i], polygons[:, i + 1]], axis=1) for i in range(1, k - 1)]
+        return np.concatenate(fan).astype(np.int32)
+
+    triangles = [(p[0], p[i], p[i + 1]) for p in polygons for i in range(1, len(p) - 1)]
+    return np.array(triangles, dtype=np.int32).reshape(-1, 3)
+
+
+def unique_rows(array):
+    """ Rows of 2d array without duplicates, sorted lexicographically. """
+    if not len(array):
+        return array
+    array = array[np.lexsort(array.T[::-1])]
+    keep = np.r_[True, np.any(array[1:] != array[:-1], axis=1)]
+    return array[keep]
+
+# number of vertices or triangles written at once
+CHUNK_SIZE = 65536
+
+PLY_HEADER = """ply
+format {} 1.0
 comment Exported triangulation
-comment 
 element vertex {}
 property float x
 property float y
@@ -47,18 +293,54 @@ property float z
 element face {}
 property list uchar int vertex_index
 end_header
-""".format(len(points), len(triangulation))
-    for point in points:
-        data += " ".join(map(str, point)) + "\n"
-    for simplex in triangulation:
-        line = "{} ".format(len(simplex))
-        line += " ".join(map(str, simplex))
-        line += "\n"
-        data += line
-    return data
+"""
+
+
+def export_ply(triangulation, points):
+    """ Returns the ascii .ply file as a string. """
+    f = io.BytesIO()
+    write_ply(f, triangulation, points)
+    return f.getvalue().decode('ascii')
+
+
+def save_ply(filename, triangulation, points, format='ascii', compact=False):
+    """ Writes the triangulation to a .ply file, see write_ply. """
+    with open(filename, "wb") as f:
+        write_ply(f, triangulation, points, format, compact)
+
+
+def write_ply(f, triangulation, points, format='ascii', compact=False):
+    """ Writes the triangulation to binary file object 'f' in blocks of CHUNK_SIZE vertices or triangles.
+        'format' is 'ascii', 'binary_little_endian' or 'binary_big_endian'.
+        If 'compact' is True, only vertices used by some triangle are written and triangles are renumbered. """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    faces = triangle_array(triangulation)
+    if compact:
+        faces, points, _ = compact_vertices(faces, points)
+
+    f.write(PLY_HEADER.format(format, len(points), len(faces)).encode('ascii'))
+
+    if format == 'ascii':
+        for start in range(0, len(points), CHUNK_SIZE):
+            np.savetxt(f, points[start:start + CHUNK_SIZE], fmt='%.9g')
+        for start in range(0, len(faces), CHUNK_SIZE):
+            np.savetxt(f, faces[start:start + CHUNK_SIZE], fmt='3 %d %d %d')
+    elif format in ('binary_little_endian', 'binary_big_endian'):
+        endian = '<' if format == 'binary_little_endian' else '>'
+        for start in range(0, len(points), CHUNK_SIZE):
+            f.write(points[start:start + CHUNK_SIZE].astype(endian + 'f4').tobytes())
+        records = np.zeros(min(len(faces), CHUNK_SIZE), dtype=[('n', 'u1'), ('v', endian + 'i4', (3,))])
+        records['n'] = 3
+        for start in range(0, len(faces), CHUNK_SIZE):
+            chunk = faces[start:start + CHUNK_SIZE]
+            records['v'][:len(chunk)] = chunk
+            f.write(records[:len(chunk)].tobytes())
+    else:
+        raise ValueError("Unknown .ply format: {}".format(format))
 
 
-def save_ply(filename, triangulation, points):
-    data = export_ply(triangulation, points)
-    with open(filename, "w") as f:
-        f.writelines(data)
+def triangle_array(triangulation):
+    """ (F, 3) int array of the triangles in the triangulation, other simplices are dropped. """
+    if isinstance(triangulation, np.ndarray):
+        return triangulation.reshape(-1, 3).astype(np.int64)
+    return np.array([t for t in triangulation if len(t) == 3], dtype=np.int64).reshape(-1, 3)
@@ -8,53 +8,310 @@
 
     Data source: http://graphics.stanford.edu/data/3Dscanrep/
 """
-from helpers import sorted_tuple, c_coordinate, error_triangle
+from helpers import sorted_tuple, c_coordinates, triangle_incidence, triangle_quadrics, triangle_planes, \
+    compact_vertices
+from cache import ARRAYS, PACKED_ARRAYS
+from edge_queue import EdgeQueue
+from mesh import CompactMesh
+from profiling import phase_timer
+from quadrics import VertexQuadrics, DTYPES, UPPER
 import numpy as np
-from queue import PriorityQueue
 
 
-def edge_contraction(graph, triangulation, points):
+def edge_contraction(graph, triangulation, points,
+                     target_faces=None, target_vertices=None, target_ratio=None, max_error=None, stats=None,
+                     compact=True, locked=None, timers=None, progress=None, progress_every=1000, record=None,
+                     cache=None, quadrics='dict', topology=None, checkpoint=None):
     """ Edge contraction algorithm.
      First calculate initial errors and sort edges according to the error in priority queue.
-     While priority queue is not empty, get edge with highest priority, update graph and update triangulation.  """
-    error = initial_quadrics(graph, triangulation, points)
-    edges_errors_pq, edge_coordinate = sort_edges(graph, error,points)
+     While priority queue is not empty, get edge with highest priority, update graph and update triangulation.
+
+     'graph' is either networkx.Graph or CompactMesh (see mesh.py). With networkx.Graph the triangles are kept in a set
+     together with an index of triangles incident to each vertex, so a contraction only touches the triangles around
+     the contracted edge. CompactMesh keeps the triangles itself and 'triangulation' is ignored.
+
+     Contraction stops early as soon as one of the given targets is met:
+     - 'target_faces': number of triangles left,
+     - 'target_vertices': number of vertices left,
+     - 'target_ratio': fraction of the initial number of triangles left (0.1 keeps 10% of triangles),
+     - 'max_error': the error of the cheapest remaining edge is larger than this value.
+
+     If 'stats' dict is given, it is updated with statistics of the edge queue (see EdgeQueue.stats) and counters of
+     the contraction loop (see contract_edges).
+
+     Profiling is off by default. If 'timers' dict is given, cumulative seconds spent in every phase of the
+     algorithm are added to it (phase -> seconds). If 'progress' is given, it is called as
+     progress(collapses, faces, max_error) after every 'progress_every' contracted edges, where 'faces' is the
+     current number of triangles and 'max_error' the largest error of a contracted edge so far.
+
+     Every contraction appends the new vertex to 'points' (the list is modified in place). With 'compact' the returned
+     points contain only the vertices of the remaining triangles and the triangles are renumbered accordingly
+     (see helpers.compact_vertices). Pass compact=False to get the triangles over all points instead.
+
+     Edges with a vertex in 'locked' (collection of vertex indices) are never contracted.
+
+     If 'record' is given (see progressive.CollapseRecord), record.start(triangles) is called with the initial
+     triangles and record.collapse(edge, c, removed_triangles, added_triangles) after every contraction.
+
+     If 'cache' is given (see cache.QuadricCache), the initial quadrics and the optimal positions and errors of the
+     edges are taken from it when the same points and triangles were simplified before.
+
+     'quadrics' selects how the quadrics are stored during the contraction: 'dict' keeps 4x4 arrays of all vertices,
+     edges and triangles in a dict (see quadrics_dict), 'packed' and 'packed32' keep only the vertex quadrics in one
+     float64 or float32 array (see quadrics.VertexQuadrics), which takes much less memory. The packed modes never
+     make quadrics of edges or triangles, also not at the start (see initial_arrays). They contract other edges
+     than 'dict': Qab of a contracted edge is summed from its triangles as they are at the time of the contraction,
+     while 'dict' keeps the quadric an edge got when it was made, also after a triangle of the edge was moved by
+     another contraction. Both are approximations of the same error, but the results differ after the first such
+     edge and, since is_safe does not keep the topology at the boundary (see topology.py), so can their topology.
+
+     If 'topology' is given (see topology.TopologyTracker), it is called like 'record' with the initial triangles and
+     after every contraction, and fails as soon as a contraction changes the Euler characteristic.
+
+     If 'checkpoint' is given (see checkpoint.Checkpoint), the state of the contraction is saved to its file every
+     so many contractions or seconds, and checkpoint.resume continues the run from the file. 'record' and 'topology'
+     are not part of the saved state. """
+    if quadrics != 'dict' and quadrics not in DTYPES:
+        raise ValueError("Unknown quadric storage: {}".format(quadrics))
+    timer = phase_timer(timers)
+    locked = set(locked) if locked is not None else set()
+    triangles, incidence, faces = triangle_index(graph, triangulation)
+    target_faces = face_target(len(faces), target_faces, target_ratio)
+    if record is not None:
+        record.start(faces)
+    if topology is not None:
+        topology.start(faces)
+    timer.lap('triangle_index')
+
+    packed = quadrics != 'dict'
+    arrays = cache.load(points, faces, PACKED_ARRAYS if packed else ARRAYS) if cache is not None else None
+    if arrays is None:
+        arrays = initial_arrays(points, faces, packed, timer)
+        if cache is not None:
+            cache.store(points, faces, arrays)
+    timer.lap('cache')
+
+    edges, positions, errors = arrays['edges'], arrays['positions'], arrays['errors']
+    if packed:
+        error = VertexQuadrics.from_packed(np.asarray(arrays['vertex_q_packed'], dtype=DTYPES[quadrics]))
+    else:
+        error = quadrics_dict(graph, faces, arrays['vertex_q'], edges, arrays['edge_q'], arrays['face_q'])
+    del arrays
+    timer.lap('initial_quadrics')
+    edges_errors_pq, edge_coordinate = edge_queue(edges, positions, errors)
+    timer.lap('sort_edges')
+
+    contract_edges(graph, triangles, incidence, points, error, edges_errors_pq, edge_coordinate,
+                   target_faces=target_faces, target_vertices=target_vertices, max_error=max_error, locked=locked,
+                   stats=stats, timers=timers, progress=progress, progress_every=progress_every, record=record,
+                   topology=topology, checkpoint=checkpoint)
+
+    if stats is not None:
+        stats.update(edges_errors_pq.stats())
+    return contraction_result(graph, triangles, points, compact, timer)
+
+
+def contraction_result(graph, triangles, points, compact=True, timer=None):
+    """ Triangles and points returned by edge_contraction after the contraction loop. The triangles are sorted, so
+        the order does not depend on the history of the set (a resumed run returns the same list) or on the graph. """
+    timer = timer or phase_timer(None)
+    timer.start()
+    triangles = sorted(triangles if triangles is not None else graph.triangles())
+    if compact:
+        faces, compact_points, _ = compact_vertices(triangles, points)
+        triangles, points = list(zip(*faces.T.tolist())), compact_points.tolist()
+    timer.lap('compact')
+    return triangles, points
+
+
+def triangle_index(graph, triangulation):
+    """ Triangles of the graph as used by contract_edges: the set of triangles (sorted tuples), the vertex -> set of
+        incident triangles index and the list of triangles. CompactMesh keeps the triangles itself, so for it the set
+        is None and the index is a view of the mesh. """
+    if isinstance(graph, CompactMesh):
+        return None, graph.incidence(), graph.triangles()
+    triangles = set(sorted_tuple(*t) for t in triangulation)
+    # sorted, so the initial quadrics are summed in the same order as for the sorted triangles of data.get_triangulation
+    return triangles, triangle_incidence(triangles), sorted(triangles)
+
+
+# counters of contract_edges, besides 'max_error'
+COUNTERS = ('attempted', 'rejected_locked', 'rejected_unsafe', 'rejected_triangles', 'collapses')
+
+
+def contract_edges(graph, triangles, incidence, points, error, edges_errors_pq, edge_coordinate,
+                   target_faces=None, target_vertices=None, max_error=None, locked=(),
+                   stats=None, timers=None, progress=None, progress_every=1000, record=None, topology=None,
+                   checkpoint=None, counters=None):
+    """ The contraction loop of edge_contraction. Takes the cheapest edge from the queue and contracts it if that is
+        safe, until the queue is empty or a target is reached. 'triangles' and 'incidence' are from triangle_index,
+        'error' from quadrics_dict (or VertexQuadrics) and the queue with positions from sort_edge_arrays, all of
+        them are updated in place. Returns the number of contracted edges.
+
+        If 'stats' dict is given, it is updated with counters of the loop: edges taken from the queue ('attempted'),
+        edges refused because of a locked vertex ('rejected_locked'), by is_safe ('rejected_unsafe') or because they
+        are not shared by exactly two triangles ('rejected_triangles'), contracted edges ('collapses') and the largest
+        error of a contracted edge ('max_error'). 'timers', 'progress', 'record' and 'topology' are as in
+        edge_contraction; the loop adds time to the phases 'queue', 'is_safe', 'two_triangles', 'contract',
+        'quadrics', 'update' and 'positions'.
+
+        'checkpoint' is as in edge_contraction, saving adds time to the phase 'checkpoint'. 'counters' are the
+        counters of an interrupted run (like in 'stats') to continue from. """
+    mesh = graph if isinstance(graph, CompactMesh) else None
+    timer = phase_timer(timers)
+    counters = counters or {}
+    attempted, rejected_locked, rejected_unsafe, rejected_triangles, collapses = (
+        counters.get(key, 0) for key in COUNTERS)
+    contracted_error = counters.get('max_error')
+
+    def loop_counters():
+        return {
+            'attempted': attempted,
+            'rejected_locked': rejected_locked,
+            'rejected_unsafe': rejected_unsafe,
+            'rejected_triangles': rejected_triangles,
+            'collapses': collapses,
+            'max_error': None if contracted_error is None else float(contracted_error),
+        }
 
     while not edges_errors_pq.empty():
-        err, edge = edges_errors_pq.get()
-        if is_safe(graph, edge):
-            points.append(edge_coordinate[edge])
-            removed, added = contract(graph, edge, triangulation, points)
-            quadrics_contract_before(graph, error, edge, points, removed, added)
-
-            for e in removed.get('edges'):
-                graph.remove_edge(*e)
-            for n in removed.get('nodes'):
-                graph.remove_node(n)
-            for t in list(set(removed.get('triangles'))):
-                if t not in triangulation:
-                    return triangulation, points
-                triangulation.remove(t)
-
-            for n in added.get('nodes'):
-                graph.add_node(n)
-            for e in added.get('edges'):
-                graph.add_edge(*e)
-            for t in list(set(added.get('triangles'))):
-                triangulation.append(t)
-
-            quadrics_contract_after(error, edge, triangulation, added['edges'])
-
-            for e in added.get('edges'):
-                c, edge_error = c_coordinate(e, error, points)
-                edge_coordinate.update({e: c})
-                c_error = np.append(c, 1)
-                pq_error = np.dot(np.dot(c_error, edge_error), np.transpose(c_error))
-                edges_errors_pq.put((pq_error, e))
-    return triangulation, points
-
-
-def contract(graph, edge, triangulation, points):
+        n_faces = len(triangles) if mesh is None else mesh.number_of_faces()
+        if target_reached(n_faces, graph.number_of_nodes(), target_faces, target_vertices):
+            break
+        err, edge = edges_errors_pq.pop()
+        if max_error is not None and err > max_error:
+            break
+        attempted += 1
+        if edge[0] in locked or edge[1] in locked:
+            rejected_locked += 1
+            continue
+        timer.lap('queue')
+        safe = is_safe(graph, edge)
+        timer.lap('is_safe')
+        if not safe:
+            rejected_unsafe += 1
+            continue
+        two_triangles = is_edge_of_two_triangles(incidence, edge) if mesh is None else mesh.can_collapse(*edge)
+        timer.lap('two_triangles')
+        if not two_triangles:
+            rejected_triangles += 1
+            continue
+
+        points.append(edge_coordinate[edge])
+        removed, added = contract(graph, edge, triangles, points, incidence)
+        timer.lap('contract')
+        quadrics_contract(error, edge, points, removed, added)
+        timer.lap('quadrics')
+
+        for e in removed.get('edges'):
+            edges_errors_pq.remove(e)
+            edge_coordinate.pop(e, None)
+        edge_coordinate.pop(edge, None)
+        timer.lap('queue')
+
+        if mesh is None:
+            update_graph(graph, removed, added)
+            update_triangles(triangles, incidence, removed.get('triangles'), added.get('triangles'))
+        else:
+            mesh.collapse(*edge, len(points) - 1)
+        if record is not None:
+            record.collapse(edge, len(points) - 1, removed['triangles'], added['triangles'])
+        if topology is not None:
+            topology.collapse(edge, removed, added)
+        timer.lap('update')
+
+        # only the edges around the new vertex change their error
+        new_edges = added.get('edges')
+        positions, errors = edge_positions(error, new_edges, points)
+        for e, c, pq_error in zip(new_edges, positions, errors.tolist()):
+            edge_coordinate[e] = c
+            edges_errors_pq.push(e, pq_error)
+        timer.lap('positions')
+
+        collapses += 1
+        contracted_error = err if contracted_error is None else max(contracted_error, err)
+        if progress is not None and collapses % progress_every == 0:
+            progress(collapses, len(triangles) if mesh is None else mesh.number_of_faces(), contracted_error)
+            timer.start()
+        if checkpoint is not None and checkpoint.due(collapses):
+            timer.lap('queue')
+            checkpoint.save(graph, triangles, points, error, edges_errors_pq, edge_coordinate, loop_counters(),
+                            dict(target_faces=target_faces, target_vertices=target_vertices, max_error=max_error,
+                                 locked=locked))
+            timer.lap('checkpoint')
+    timer.lap('queue')
+
+    if stats is not None:
+        stats.update(loop_counters())
+    return collapses
+
+
+
+def face_target(n_faces, target_faces=None, target_ratio=None):
+    """ Combines absolute and relative face targets into one number of triangles (the larger one wins). """
+    if target_ratio is not None:
+        if not 0 <= target_ratio <= 1:
+            raise ValueError("Target ratio should be between 0 and 1.")
+        ratio_faces = int(round(target_ratio * n_faces))
+        target_faces = ratio_faces if target_faces is None else max(target_faces, ratio_faces)
+    return target_faces
+
+
+def target_reached(n_faces, n_vertices, target_faces=None, target_vertices=None):
+    """ Check if the triangulation is already small enough. """
+    if target_faces is not None and n_faces <= target_faces:
+        return True
+    if target_vertices is not None and n_vertices <= target_vertices:
+        return True
+    return False
+
+
+def update_graph(graph, removed, added):
+    """ Applies the contraction computed by contract to networkx.Graph. """
+    for e in removed.get('edges'):
+        graph.remove_edge(*e)
+    for n in removed.get('nodes'):
+        graph.remove_node(n)
+
+    for n in added.get('nodes'):
+        graph.add_node(n)
+    for e in added.get('edges'):
+        graph.add_edge(*e)
+
+
+def update_triangles(triangles, incidence, removed_triangles, added_triangles):
+    """ Removes and adds triangles in the triangle set and keeps the vertex incidence index up to date. """
+    for t in set(removed_triangles):
+        triangles.discard(t)
+        for x in t:
+            incident = incidence.get(x)
+            if incident is not None:
+                incident.discard(t)
+                if not incident:
+                    del incidence[x]
+
+    for t in set(added_triangles):
+        triangles.add(t)
+        for x in t:
+            incidence.setdefault(x, set()).add(t)
+
+
+def is_edge_of_two_triangles(incidence, edge):
+    """ Check that the edge is shared by exactly two triangles, i.e. both vertices of its link span a triangle
+        with the edge. Contracting an edge that fails this would leave a hole in the triangulation. Like
+        CompactMesh.can_collapse, the edge is also refused if triangles (a, x, y) and (b, x, y) over its link {x, y}
+        both exist: they would become the same triangle (c, x, y). """
+    a, b = edge
+    star_a, star_b = incidence.get(a, set()), incidence.get(b, set())
+    shared = star_a & star_b
+    if len(shared) != 2:
+        return False
+    link = set(x for t in shared for x in t) - {a, b}
+    spanning = [t for t in star_a ^ star_b if link.issubset(t)]
+    return len(spanning) < 2
+
+
+def contract(graph, edge, triangulation, points, incidence=None):
     """ Simulates removal of edge '(a, b)' and added new node 'c'. Does not correct the graph.
 
         What it does:
@@ -68,6 +325,9 @@ def contract(graph, edge, triangulation, points):
         Ex.:
             added = {'nodes': [(1,)], 'edges': [(1,2), (1,3)], 'triangles': [(1,2,3)]}
             removed = {'nodes': [(4,)], 'edges': [(2,4), (3,4)], 'triangles': [(2,3,4)]}
+
+        If 'incidence' (vertex -> set of incident triangles) is given, only the triangles around 'a' and 'b'
+        are visited instead of the whole triangulation.
     """
     removed = {'nodes': [], 'edges': [], 'triangles': []}
     added = {'nodes': [], 'edges': [], 'triangles': []}
@@ -124,7 +384,12 @@ def contract(graph, edge, triangulation, points):
               removed['triangles'].append(sorted_tuple(i, j, k))
               added['triangles'].append(sorted_tuple(i, j, c))
     """
-    for t in triangulation:
+    if incidence is None:
+        star = triangulation
+    else:
+        star = incidence.get(a, set()) | incidence.get(b, set())
+
+    for t in star:
         difference = set(t).difference({a, b})
         if len(difference) == 2:
             removed['triangles'].append(sorted_tuple(*t))
@@ -134,95 +399,155 @@ def contract(graph, edge, triangulation, points):
 
 
 def initial_quadrics(graph, triangulation, points):
-    quadrics = {}
+    """ Quadrics of all vertices, edges and triangles in a dict keyed by sorted tuples of vertices.
+        Computed in one batch by initial_quadric_arrays. Vertices without triangles get a zero quadric. """
+    triangulation = list(triangulation)
+    return quadrics_dict(graph, triangulation, *initial_quadric_arrays(points, triangulation))
+
 
+def quadrics_dict(graph, triangulation, vertex_q, edges, edge_q, face_q):
+    """ Dict of quadrics keyed by sorted tuples of vertices from the arrays of initial_quadric_arrays. """
+    quadrics = {}
+    zero = np.zeros((4, 4))
     for i in graph.nodes():
-        quadrics[(i,)] = np.array([[0 for _ in range(4)] for _ in range(4)])
+        quadrics[(i,)] = vertex_q[i] if i < len(vertex_q) else zero
 
-    for e in graph.edges():
-        quadrics[sorted_tuple(*e)] = np.array([[0 for _ in range(4)] for _ in range(4)])
+    for e, q in zip(zip(edges[:, 0].tolist(), edges[:, 1].tolist()), edge_q):
+        quadrics[e] = q
 
-    for t in triangulation:
-        quadrics[sorted_tuple(*t)] = np.array([[0 for _ in range(4)] for _ in range(4)])
+    for t, q in zip(triangulation, face_q):
+        quadrics[sorted_tuple(*t)] = q
 
-    # Qabx
-    for i, triangle in enumerate(triangulation):
-        a, b, c = triangle
-        quadrics[sorted_tuple(*triangle)] = error_triangle(a, b, c, points)
+    return quadrics
 
-        for x in (a, b, c):
-            for y in (a, b, c):
-                # we visit each pair once (x < y is unique pair)
-                if x < y:
 
-                    # Qab
-                    if sorted_tuple(x, y) not in quadrics.keys():
-                        quadrics[sorted_tuple(x, y)] = np.array([[0 for _ in range(4)] for _ in range(4)])
-                    quadrics[sorted_tuple(x, y)] = np.add(quadrics[sorted_tuple(x, y)], quadrics[sorted_tuple(*triangle)])
+def initial_arrays(points, faces, packed=False, timer=None):
+    """ Initial quadrics, the edges and their optimal positions and errors, as a dict of arrays named like in
+        cache.ARRAYS, or cache.PACKED_ARRAYS if 'packed': then only the (N, 10) packed float64 vertex quadrics are
+        made (see vertex_quadric_array) and the positions are computed in blocks of edges (see edge_arrays). """
+    timer = timer or phase_timer(None)
+    if packed:
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+        vertex_q = VertexQuadrics.from_packed(vertex_quadric_array(points, faces))
+        edges = unique_edges(faces, len(points))
+        timer.lap('initial_quadrics')
+        positions, errors = edge_arrays(edges, vertex_q, points)
+        timer.lap('sort_edges')
+        return dict(vertex_q_packed=vertex_q.packed[:len(vertex_q)], edges=edges, positions=positions, errors=errors)
+
+    vertex_q, edges, edge_q, face_q = initial_quadric_arrays(points, faces)
+    timer.lap('initial_quadrics')
+    positions, errors = c_coordinates(edges, vertex_q, points)
+    timer.lap('sort_edges')
+    return dict(vertex_q=vertex_q, edges=edges, edge_q=edge_q, face_q=face_q, positions=positions, errors=errors)
+
+
+def initial_quadric_arrays(points, faces):
+    """ Batched initial quadrics.
+        'points' is (N, 3) array of coordinates and 'faces' (F, 3) array of point indices.
+
+        Qabc is the outer product of the plane of triangle abc, Qab is the sum of Qabx over triangles with the edge ab
+        and Qa is the sum of Qaxy over triangles with the vertex a.
+
+        Returns (N, 4, 4) vertex quadrics, (E, 2) sorted edges, (E, 4, 4) edge quadrics and (F, 4, 4) triangle quadrics.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    n = len(points)
 
-                    # Qa
-                    #if (x,) not in quadrics.keys():
-                    #    quadrics[(x,)] = np.array([[0 for _ in range(4)] for _ in range(4)])
-                    #quadrics[(x,)] = np.add(quadrics[(x,)], quadrics[sorted_tuple(x, y)])
+    face_q = triangle_quadrics(points, faces)
+    flat_q = face_q.reshape(-1, 16)
 
-                    #if (y,) not in quadrics.keys():
-                    #    quadrics[(y,)] = np.array([[0 for _ in range(4)] for _ in range(4)])
-                    #quadrics[(y,)] = np.add(quadrics[(y,)], quadrics[sorted_tuple(x, y)])
+    # Qa: every triangle is added to each of its three vertices
+    vertex_q = scatter_add(faces.ravel(), flat_q, n)
 
-            if (x,) not in quadrics.keys():
-                quadrics[(x,)] = np.array([[0 for _ in range(4)] for _ in range(4)])
-            quadrics[(x,)] = np.add(quadrics[(x,)], quadrics[sorted_tuple(*triangle)])
+    # Qab: every triangle is added to each of its three edges
+    edges, edge_index = unique_edges(faces, n, return_index=True)
+    edge_q = scatter_add(edge_index, flat_q, len(edges))
 
-    return quadrics
+    return vertex_q.reshape(-1, 4, 4), edges, edge_q.reshape(-1, 4, 4), face_q
 
 
-def quadrics_contract_before(graph, quadrics, edge, points, removed, added):
-    """ Score that measures how deformed the graph becomes by contracting the edge. """
-    a, b = sorted_tuple(*edge)
+def vertex_quadric_array(points, faces):
+    """ (N, 10) packed float64 vertex quadrics of initial_quadric_arrays (with the same values), made from the
+        packed (F, 10) quadrics of the triangles without any (F, 4, 4) or edge quadrics. """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    planes = triangle_planes(points, faces)
+    return scatter_add(faces.ravel(), planes[:, UPPER[0]] * planes[:, UPPER[1]], len(points))
 
-    # error of new point -- there is only one added point when contracting an edge
-    c = added['nodes']
-    if len(c) != 1:
-        raise Exception("Contraction should result in only one point.")
-    c = c[0]
-    quadrics[(c,)] = np.subtract(np.add(quadrics[(a,)], quadrics[(b,)]), quadrics[sorted_tuple(a, b)])
 
-    # error of new edges by formula -- we need to calculate this before removing edges and triangles
-    x, y = link_of_edge(graph, (a, b))
-    t1, t2 = sorted_tuple(a, b, x), sorted_tuple(a, b, y)
-    if t1 not in quadrics.keys():
-        return
-        quadrics[t1] = error_triangle(*t1, points)
-    if t2 not in quadrics.keys():
-        quadrics[t2] = error_triangle(*t2, points)
+def unique_edges(faces, n, return_index=False):
+    """ (E, 2) sorted edges of the (F, 3) triangles over 'n' points, sorted. With 'return_index' also the index of
+        the edge of every side of every triangle, three per triangle. """
+    face_edges = np.sort(faces[:, [0, 1, 1, 2, 0, 2]].reshape(-1, 2), axis=1)
+    keys, edge_index = np.unique(face_edges[:, 0] * n + face_edges[:, 1], return_inverse=True)
+    edges = np.stack([keys // n, keys % n], axis=1)
+    return (edges, edge_index.ravel()) if return_index else edges
 
-    quadrics[sorted_tuple(c, x)] = np.subtract(np.add(quadrics[sorted_tuple(a, x)], quadrics[sorted_tuple(b, x)]), quadrics[sorted_tuple(a, b, x)])
-    quadrics[sorted_tuple(c, y)] = np.subtract(np.add(quadrics[sorted_tuple(a, y)], quadrics[sorted_tuple(b, y)]), quadrics[sorted_tuple(a, b, y)])
 
-    # error of new triangles -- the easiest to calculate, doesn't need other errors
-    for triangle in added["triangles"]:
-        quadrics[sorted_tuple(*triangle)] = error_triangle(*triangle, points)
+def edge_arrays(edges, vertex_q, points, block=2 ** 12):
+    """ Optimal positions and errors of the (E, 2) edges like c_coordinates, in blocks of edges, so the quadrics of
+        all edges are never made at once. """
+    positions, errors = np.empty((len(edges), 3)), np.empty(len(edges))
+    for start in range(0, len(edges), block):
+        positions[start:start + block], errors[start:start + block] = c_coordinates(
+            edges[start:start + block], vertex_q, points)
+    return positions, errors
 
-    # remove old points
-    for n in removed["nodes"]:
-        quadrics.pop(n, None)
 
-    # remove old edges
-    for e in removed["edges"]:
-        quadrics.pop(e, None)
+def scatter_add(index, values, length):
+    """ Sums rows of (K, M) 'values' into (length, M) array by 'index' (like np.add.at, but with bincount).
+        If 'index' is longer than K, every row is added at that many consecutive indices (a row per triangle with
+        the indices of its three vertices), without making the repeated rows for all columns at once. """
+    result = np.empty((length, values.shape[1]))
+    repeats = len(index) // max(len(values), 1)
+    for j in range(values.shape[1]):
+        result[:, j] = np.bincount(index, weights=np.repeat(values[:, j], repeats), minlength=length)
+    return result
 
-    # remove old triangles
-    for t in removed["triangles"]:
+
+def quadrics_contract(quadrics, edge, points, removed, added):
+    """ Updates the quadrics after contracting the edge, with 'removed' and 'added' from contract.
+        The new point 'c' is already the last one in 'points'.
+
+        Only quadrics in the star of 'c' change: Qc = Qa + Qb - Qab, the triangles around 'c' are new and get their
+        quadrics in one batch and every edge (c, x) gets the sum of quadrics of the new triangles with 'x'. Quadrics of
+        triangles and edges away from 'c' are kept. Quadrics of removed vertices, edges and triangles are dropped.
+
+        With VertexQuadrics only the quadric of 'c' is added. """
+    if isinstance(quadrics, VertexQuadrics):
+        quadrics.contract(edge, points, removed)
+        return
+    a, b = sorted_tuple(*edge)
+    c = added['nodes']
+    if len(c) != 1:
+        raise Exception("Contraction should result in only one point.")
+    c = c[0]
+    quadrics[(c,)] = quadrics[(a,)] + quadrics[(b,)] - quadrics[(a, b)]
+
+    # sorted, so the sums below do not depend on the order of sets (see checkpoint.resume)
+    triangles = sorted(set(added['triangles']))
+    corners = np.array([points[x] for t in triangles for x in t], dtype=float).reshape(-1, 3)
+    triangle_q = triangle_quadrics(corners, np.arange(len(corners)).reshape(-1, 3))
+
+    for e in added['edges']:
+        quadrics[e] = np.zeros((4, 4))
+    for t, q in zip(triangles, triangle_q):
+        quadrics[t] = q
+        for x in t:
+            if x != c:
+                quadrics[sorted_tuple(c, x)] += q
+
+    for n in removed['nodes']:
+        quadrics.pop((n,), None)
+    quadrics.pop((a, b), None)
+    for e in removed['edges']:
+        quadrics.pop(e, None)
+    for t in removed['triangles']:
         quadrics.pop(t, None)
 
-def quadrics_contract_after(error, edge, triangulation, added_edges):
-    # error of other edges -- we need new triangles and should not use old ones here
-    for e in added_edges:
-        if e != edge:
-            error[sorted_tuple(*e)] = np.array([[0 for _ in range(4)] for _ in range(4)])
-            for x, y, z in triangulation:
-                if set(e).issubset({x, y, z}):
-                    error[sorted_tuple(*e)] = np.add(error[sorted_tuple(*e)], error[sorted_tuple(x, y, z)])
 
 def link_of_edge(graph, edge):
     neigh_a = set(graph.neighbors(edge[0]))
@@ -238,22 +563,58 @@ def link_of_node(graph, a):
 
 def sort_edges(graph, error,points):
     """ Sort edges in triangulation according to deformation to graph. """
-    error_edge_pq = PriorityQueue()
-    edge_c_dict=dict()
+    edges = [sorted_tuple(*e) for e in graph.edges()]
+    c, errors = edge_positions(error, edges, points)
+    return EdgeQueue(zip(errors.tolist(), edges)), dict(zip(edges, c))
 
-    for e in graph.edges():
-        c , edge_error=c_coordinate(e,error,points)
-        edge_c_dict.update({e:c})
-        c_error = np.append(c,1)
-        pq_error = np.dot(np.dot(c_error,edge_error),np.transpose(c_error))
-        error_edge_pq.put((pq_error, e))
 
-    return error_edge_pq, edge_c_dict
+def edge_positions(quadrics, edges, points):
+    """ Optimal positions and errors of the edges (list of pairs of vertices) from the vertex quadrics in the dict
+        or VertexQuadrics, computed in one batch by c_coordinates. """
+    vertices = list(dict.fromkeys(x for e in edges for x in e))
+    index = {x: i for i, x in enumerate(vertices)}
+    if isinstance(quadrics, VertexQuadrics):
+        vertex_q = quadrics.get(vertices)
+    else:
+        vertex_q = np.array([quadrics[(x,)] for x in vertices]).reshape(-1, 4, 4)
+    return c_coordinates([(index[a], index[b]) for a, b in edges], vertex_q,
+                         np.array([points[x] for x in vertices], dtype=float).reshape(-1, 3))
+
+
+def sort_edge_arrays(edges, vertex_q, points):
+    """ Like sort_edges, but for (E, 2) array of sorted edges and (N, 4, 4) array of vertex quadrics.
+        Optimal positions and errors of all edges are computed in one batch and the queue is built with one heapify. """
+    return edge_queue(edges, *c_coordinates(edges, vertex_q, points))
+
+
+def edge_queue(edges, positions, errors):
+    """ Queue of (E, 2) array of sorted edges with (E,) errors and dict of their (E, 3) optimal positions. """
+    edges = list(zip(edges[:, 0].tolist(), edges[:, 1].tolist()))
+    return EdgeQueue(zip(errors.tolist(), edges)), dict(zip(edges, positions))
 
 
 def is_safe(graph, edge):
-    """ Check if contraction of an edge preserves the topological type """
+    """ Check if contraction of an edge preserves the topological type.
 
+        The links of 'a' and 'b' (link_of_node) are sets of neighbours and of edges (a, x) and (b, y), which are
+        never equal, so the links intersect exactly in the common neighbours. The condition Lk(a, b) = Lk(a) & Lk(b)
+        with |Lk(a, b)| = 2 is then that the edge exists and 'a' and 'b' have exactly two common neighbours.
+        The neighbours of each vertex are found once and vertices with fewer than three neighbours are refused
+        before intersecting. See link_condition.safe_edges for the same check of many edges at once. """
+    a, b = edge
+    if not (graph.has_node(a) and graph.has_node(b)):
+        return False
+    neighbors_a = set(graph.neighbors(a))
+    if b not in neighbors_a or len(neighbors_a) < 3:
+        return False
+    neighbors_b = set(graph.neighbors(b))
+    if len(neighbors_b) < 3:
+        return False
+    return len(neighbors_a.intersection(neighbors_b)) == 2
+
+
+def is_safe_by_links(graph, edge):
+    """ is_safe written with links, as in the definition. Much slower, the tests check is_safe against it. """
     if graph.has_edge(*edge):
         edge_link = link_of_edge(graph, edge)
         edge_v1_link = link_of_node(graph, edge[0])
@@ -390,4 +751,4 @@ def initial_error(graph, triangulation, points):
     return error
 
 
-"""
\ No newline at end of file
+"""
@@ -0,0 +1,103 @@
+"""
+    Priority queue of edges ordered by contraction error.
+
+    Entries are kept in a binary heap (heapq) and are never removed from the middle of the heap. Instead every
+    edge has a version stamp: pushing an edge again or removing it makes its older entries stale, and stale
+    entries are skipped when they reach the top of the heap. Versions are the number of pushes so far, so they only
+    grow and an edge pushed again after it was removed or popped never brings its old entries back.
+"""
+import heapq
+
+import numpy as np
+
+
+class EdgeQueue:
+
+    def __init__(self, entries=()):
+        """ Builds the queue from (error, edge) pairs with a single heapify. """
+        self.heap = []
+        self.version = {}
+        self.pushes = 0
+        self.pops = 0
+        self.stale_pops = 0
+
+        for error, edge in entries:
+            self.version[edge] = self.pushes
+            self.heap.append((error, edge, self.pushes))
+            self.pushes += 1
+        heapq.heapify(self.heap)
+
+    def __len__(self):
+        """ Number of edges in the queue (without stale entries). """
+        return len(self.version)
+
+    def __contains__(self, edge):
+        return edge in self.version
+
+    def push(self, edge, error):
+        """ Adds the edge or changes its error if it is already in the queue. """
+        self.version[edge] = self.pushes
+        heapq.heappush(self.heap, (error, edge, self.pushes))
+        self.pushes += 1
+
+    def remove(self, edge):
+        """ Removes the edge from the queue. Its entries stay in the heap and are skipped later. """
+        self.version.pop(edge, None)
+
+    def empty(self):
+        self._skip_stale()
+        return not self.heap
+
+    def peek(self):
+        """ Returns (error, edge) with the smallest error without removing it. """
+        self._skip_stale()
+        error, edge, _ = self.heap[0]
+        return error, edge
+
+    def pop(self):
+        """ Removes and returns (error, edge) with the smallest error. """
+        self._skip_stale()
+        error, edge, _ = heapq.heappop(self.heap)
+        del self.version[edge]
+        self.pops += 1
+        return error, edge
+
+    def _skip_stale(self):
+        heap, version = self.heap, self.version
+        while heap and version.get(heap[0][1]) != heap[0][2]:
+            heapq.heappop(heap)
+            self.stale_pops += 1
+
+    def arrays(self):
+        """ Dict of arrays with the whole state of the queue: heap entries in heap order, versions of the edges in
+            the queue and the counters. See from_arrays. """
+        return {
+            'errors': np.array([entry[0] for entry in self.heap], dtype=float),
+            'edges': np.array([entry[1] for entry in self.heap], dtype=np.int64).reshape(-1, 2),
+            'versions': np.array([entry[2] for entry in self.heap], dtype=np.int64),
+            'live_edges': np.array(list(self.version), dtype=np.int64).reshape(-1, 2),
+            'live_versions': np.array(list(self.version.values()), dtype=np.int64),
+            'counts': np.array([self.pushes, self.pops, self.stale_pops], dtype=np.int64),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """ EdgeQueue with the state from the dict of arrays made by arrays(). """
+        queue = cls()
+        edges = list(map(tuple, arrays['edges'].tolist()))
+        queue.heap = list(zip(arrays['errors'].tolist(), edges, arrays['versions'].tolist()))
+        queue.version = dict(zip(map(tuple, arrays['live_edges'].tolist()), arrays['live_versions'].tolist()))
+        queue.pushes, queue.pops, queue.stale_pops = arrays['counts'].tolist()
+        return queue
+
+    def stats(self):
+        """ Size of the heap, number of live edges and ratio of stale entries among all entries taken off. """
+        taken = self.pops + self.stale_pops
+        return {
+            'queue_size': len(self.heap),
+            'queue_edges': len(self.version),
+            'queue_pushes': self.pushes,
+            'queue_pops': self.pops,
+            'stale_pops': self.stale_pops,
+            'stale_ratio': self.stale_pops / taken if taken else 0.0,
+        }
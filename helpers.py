@@ -1,16 +1,19 @@
 """
     Plots and homology helper functions.
+
+    matplotlib, networkx and gudhi are imported only by the functions that use them, so the rest of the helpers
+    (and the simplification itself) does not load them.
 """
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.tri as mtri
-import networkx as nx
-import gudhi
 
 
 def plot(triangulation, points):
-    x, y, z = map(list, zip(*points))
-    triang = mtri.Triangulation(x, y, triangles=triangulation)
+    """ Interactive plot, needs a display. See preview.py for images without one. """
+    import matplotlib.pyplot as plt
+    import matplotlib.tri as mtri
+
+    x, y, z = np.asarray(points, dtype=float).reshape(-1, 3).T
+    triang = mtri.Triangulation(x, y, triangles=np.asarray(triangulation).reshape(-1, 3))
 
     fig = plt.figure()
     ax = fig.add_subplot(111, projection='3d')
@@ -19,6 +22,8 @@ def plot(triangulation, points):
 
 
 def triangulation_to_graph(triangulation, points):
+    import networkx as nx
+
     graph = nx.Graph()
 
     # nodes are indices of points
@@ -32,6 +37,15 @@ def triangulation_to_graph(triangulation, points):
     return graph
 
 
+def triangle_incidence(triangulation):
+    """ Returns dict mapping every vertex to the set of triangles incident to it. """
+    incidence = {}
+    for t in triangulation:
+        for x in t:
+            incidence.setdefault(x, set()).add(t)
+    return incidence
+
+
 def triangle_normal(a, b, c):
     ab = np.array(b) - np.array(a)
     ac = np.array(c) - np.array(a)
@@ -47,17 +61,61 @@ def triangle_normal2(a, b, c):
     d = -cross.dot(a)
     return np.append(cross,d)
 
-def c_coordinate(e,error,points):
-    a, b = e
-    edge_error = error[(a,)] + error[(b,)]
-    try:
-        c = np.linalg.solve(edge_error[:-1, :-1], -edge_error[:-1, -1])
-    except np.linalg.LinAlgError:
-        a, b = e
-        a_coordinate = points[a]
-        b_coordinate = points[b]
-        c = (np.array(a_coordinate) + np.array(b_coordinate)) / 2
-    return c,edge_error
+def triangle_planes(points, faces):
+    """ Vectorized triangle_normal2 for all triangles at once.
+        'points' is (N, 3) array of coordinates, 'faces' is (F, 3) array of point indices.
+        Returns (F, 4) array of plane coefficients (unit normal and offset).
+        Degenerate triangles (zero area) get a zero plane instead of NaN. """
+    points = np.asarray(points, dtype=float)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    a, b, c = points[faces[:, 0]], points[faces[:, 1]], points[faces[:, 2]]
+    cross = np.cross(b - a, c - a)
+    norm = np.sqrt(np.einsum('ij,ij->i', cross, cross))
+    normal = np.divide(cross, norm[:, None], out=np.zeros_like(cross), where=norm[:, None] > 0)
+    d = -np.einsum('ij,ij->i', normal, a)
+    return np.hstack([normal, d[:, None]])
+
+
+def triangle_quadrics(points, faces):
+    """ Vectorized error_triangle: (F, 4, 4) stack of outer products of triangle planes. """
+    planes = triangle_planes(points, faces)
+    return planes[:, :, None] * planes[:, None, :]
+
+
+# systems with |det| below this fraction of ||Q||^3 are treated as singular
+SINGULAR_TOLERANCE = 1e-8
+
+
+def c_coordinates(edges, vertex_quadrics, points):
+    """ Positions of the new vertices of (E, 2) array of edges that minimize the errors of the edge quadrics Qa + Qb,
+        for (N, 4, 4) array of vertex quadrics (or VertexQuadrics). All well-conditioned systems are solved in one
+        batched call; the others (singular or ill-conditioned) fall back to the best of the endpoints and the
+        midpoint. Returns (E, 3) positions and (E,) errors at these positions. """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    points = np.asarray(points, dtype=float)
+    edge_error = vertex_quadrics[edges[:, 0]] + vertex_quadrics[edges[:, 1]]
+    A = edge_error[:, :-1, :-1]
+
+    scale = np.einsum('eij,eij->e', A, A) ** 1.5
+    solvable = np.abs(np.linalg.det(A)) > SINGULAR_TOLERANCE * scale
+
+    c = np.empty((len(edges), 3))
+    c[solvable] = np.linalg.solve(A[solvable], -edge_error[solvable, :-1, -1:])[:, :, 0]
+
+    rest = ~solvable
+    if rest.any():
+        a, b = points[edges[rest, 0]], points[edges[rest, 1]]
+        candidates = np.stack([a, b, (a + b) / 2], axis=1)
+        errors = quadric_errors(edge_error[rest, None], candidates)
+        c[rest] = candidates[np.arange(len(candidates)), np.argmin(errors, axis=1)]
+
+    return c, quadric_errors(edge_error, c)
+
+
+def quadric_errors(quadrics, positions):
+    """ Error v^T Q v of (..., 3) positions for (..., 4, 4) quadrics, where v = (x, y, z, 1). """
+    v = np.concatenate([positions, np.ones(np.shape(positions)[:-1] + (1,))], axis=-1)
+    return np.einsum('...i,...ij,...j->...', v, quadrics, v)
 
 
 def error_triangle(a, b, c, points):
@@ -65,11 +123,27 @@ def error_triangle(a, b, c, points):
     return np.outer(u, np.transpose(u))
 
 
+def compact_vertices(triangulation, points):
+    """ Drops vertices that are not used by any triangle and renumbers the triangles.
+        Returns (F, 3) int array of triangles, (M, 3) array of points and (N,) array that maps old indices of
+        points to new ones (-1 for dropped points), so other per-vertex data can be carried along. """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    faces = np.asarray(triangulation, dtype=np.int64).reshape(-1, 3)
+
+    used = np.zeros(len(points), dtype=bool)
+    used[faces.ravel()] = True
+    mapping = np.cumsum(used) - 1
+    mapping[~used] = -1
+    return mapping[faces], points[used], mapping
+
+
 def sorted_tuple(*lst):
     return tuple(sorted(lst))
 
 
 def homology(triangulation, points):
+    import gudhi
+
     # build a complex from triangulation -- our simplices are triangles
     simplexTree = gudhi.simplex_tree.SimplexTree()
     for x, y, z in triangulation:
@@ -94,12 +168,11 @@ def homology(triangulation, points):
 
 
 def plot_simplex_tree(sx_tree, points):
-    x, y, z = [], [], []
-    for ii, zi in sx_tree.get_filtration():
-        for i in ii:
-            x.append(points[i][0])
-            y.append(points[i][1])
-            z.append(points[i][2])
+    import matplotlib.pyplot as plt
+
+    # only the vertices are plotted, so only the 0-skeleton is needed
+    vertices = [simplex[0] for simplex, _ in sx_tree.get_skeleton(0)]
+    x, y, z = np.asarray(points, dtype=float).reshape(-1, 3)[vertices].T
 
     fig = plt.figure()
     ax = fig.add_subplot(111, projection='3d')
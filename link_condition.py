@@ -0,0 +1,49 @@
+"""
+    Batch evaluation of the condition of edge_contraction.is_safe on a compact adjacency.
+
+    The adjacency is in the compressed sparse row format: the sorted neighbours of vertex v are
+    indices[indptr[v]:indptr[v + 1]]. An edge (a, b) passes is_safe if it exists and a and b have exactly two
+    common neighbours. Many edges are checked at once with array operations, so candidates can be screened before
+    they are checked one by one on the changing graph.
+"""
+import numpy as np
+
+
+def adjacency(edges, n_vertices):
+    """ Compressed sparse row adjacency (indptr, indices) of (E, 2) array of edges of an undirected graph. """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    both = np.concatenate([edges, edges[:, ::-1]])
+    keys = np.unique(both[:, 0] * n_vertices + both[:, 1])
+    indptr = np.zeros(n_vertices + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys // n_vertices, minlength=n_vertices), out=indptr[1:])
+    return indptr, keys % n_vertices
+
+
+def safe_edges(indptr, indices, edges):
+    """ Boolean mask of (E, 2) array of edges that would pass is_safe on the graph with the given adjacency. """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    n = len(indptr) - 1
+    valence = np.diff(indptr)
+    keys = np.repeat(np.arange(n, dtype=np.int64), valence) * n + indices
+    a, b = edges[:, 0], edges[:, 1]
+
+    # cheap exits: the edge must exist and both vertices need the other one and two common neighbours
+    safe = contains(keys, a * n + b) & (valence[a] >= 3) & (valence[b] >= 3)
+
+    # for every neighbour x of a check if (b, x) is an edge
+    candidates = np.flatnonzero(safe)
+    counts = valence[a[candidates]]
+    owner = np.repeat(candidates, counts)
+    first = np.repeat(indptr[a[candidates]] - np.cumsum(counts) + counts, counts)
+    x = indices[first + np.arange(len(owner))]
+    common = np.bincount(owner, weights=contains(keys, b[owner] * n + x), minlength=len(edges))
+
+    return safe & (common == 2)
+
+
+def contains(sorted_keys, keys):
+    """ Boolean mask of keys that are in the sorted array. """
+    position = np.searchsorted(sorted_keys, keys)
+    found = position < len(sorted_keys)
+    found[found] = sorted_keys[position[found]] == keys[found]
+    return found
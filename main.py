@@ -3,25 +3,115 @@
 
     Implement an algorithm for simplifying surface triangulations by deleting superfluous edges.
 
+    Usage:
+        python main.py bunny/reconstruction/bun_zipper_res2.ply simplified.ply --target 0.1
+        python main.py bunny/reconstruction simplified/ --target 1000 --format binary_little_endian
+
+    If the input is a directory, every .ply file in it is simplified to the output directory. Plots and homology
+    (--plot, --homology) need matplotlib and gudhi, the simplification itself does not. --verify is a cheap check of
+    the topology (Euler characteristic, components and boundary loops, see topology.py), --homology the deep one.
 """
+import argparse
+import os
+import time
+
+import data, helpers, topology
+from cache import QuadricCache
+from checkpoint import Checkpoint
+from simplify import simplify, ply_files
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description="Simplifies surface triangulations from .ply files.")
+    parser.add_argument("input", help=".ply file or directory of .ply files")
+    parser.add_argument("output", nargs="?", help=".ply file or directory for the results (required for a directory)")
+    parser.add_argument("--target", type=float,
+                        help="number of triangles to keep, or fraction of triangles to keep if smaller than 1")
+    parser.add_argument("--target-vertices", type=int, help="number of vertices to keep")
+    parser.add_argument("--max-error", type=float, help="largest error of a contracted edge")
+    parser.add_argument("--format", default="ascii", choices=["ascii", "binary_little_endian", "binary_big_endian"],
+                        help="format of the written .ply files")
+    parser.add_argument("--workers", type=int, default=1, help="number of processes (splits the mesh)")
+    parser.add_argument("--cache", help="directory for cached initial quadrics of the inputs")
+    parser.add_argument("--engine", default="sequential", choices=["sequential", "rounds"],
+                        help="contract one edge at a time or rounds of independent edges (faster)")
+    parser.add_argument("--quadrics", default="dict", choices=["dict", "packed", "packed32"],
+                        help="keep quadrics of all simplices in a dict or only vertex quadrics in a packed array")
+    parser.add_argument("--checkpoint", help="file to save the state of the contraction to (one input file only)")
+    parser.add_argument("--checkpoint-every", type=int, help="save the checkpoint after this many contractions")
+    parser.add_argument("--checkpoint-seconds", type=float, default=60.0,
+                        help="save the checkpoint after this many seconds (default: 60)")
+    parser.add_argument("--resume", action="store_true", help="continue from the checkpoint file if it exists")
+    parser.add_argument("--verify", action="store_true",
+                        help="check Euler characteristic, components and boundary loops before and after")
+    parser.add_argument("--homology", action="store_true", help="print homology before and after (needs gudhi)")
+    parser.add_argument("--plot", action="store_true", help="plot the triangulation before and after (needs a display)")
+    parser.add_argument("--preview",
+                        help="PNG file with thumbnails before and after (for a directory: directory of <name>.png)")
+    return parser.parse_args(args)
+
 
-import data, helpers, edge_contraction
+def main(args=None):
+    args = parse_args(args)
+    if os.path.isdir(args.input):
+        if args.output is None:
+            raise SystemExit("Output directory is required when the input is a directory.")
+        os.makedirs(args.output, exist_ok=True)
+        jobs = [(path, os.path.join(args.output, os.path.basename(path))) for path in ply_files(args.input)]
+        if args.checkpoint:
+            raise SystemExit("Checkpoints can only be used with one input file.")
+        if args.preview:
+            os.makedirs(args.preview, exist_ok=True)
+            jobs = [(input, output, os.path.join(args.preview, os.path.splitext(os.path.basename(input))[0] + '.png'))
+                    for input, output in jobs]
+        else:
+            jobs = [(input, output, None) for input, output in jobs]
+    else:
+        jobs = [(args.input, args.output, args.preview)]
 
-res = ["", "_res2", "_res3", "_res4"]
+    cache = QuadricCache(args.cache) if args.cache else None
+    for input, output, preview in jobs:
+        run(input, output, args, cache, preview)
 
-# testing read_data and plotting
-in_file = "bunny/reconstruction/bun_zipper" + res[1] + ".ply"
-points, triangulation = data.get_triangulation(in_file)
 
-print("n triangles:", len(triangulation))
-print("homology", helpers.homology(triangulation, points))
+def run(input, output, args, cache=None, preview=None):
+    """ Simplifies one file and prints the sizes of the triangulation before and after. 'preview' is the name of
+        the PNG file for its thumbnails. """
+    print(input)
+    # simplify reads the file itself and counts its triangles, only homology and plots need it here
+    if args.homology or args.plot:
+        points, triangulation = data.get_triangulation(input)
+        if args.homology:
+            print("homology", helpers.homology(triangulation, points))
+        if args.plot:
+            helpers.plot(triangulation, points)
 
-helpers.plot(triangulation, points)
-graph = helpers.triangulation_to_graph(triangulation, points)
+    stats = {}
+    checkpoint = None
+    if args.checkpoint:
+        checkpoint = Checkpoint(args.checkpoint, every=args.checkpoint_every, seconds=args.checkpoint_seconds)
+    start = time.perf_counter()
+    try:
+        triangulation, points = simplify(input, output, target=args.target, target_vertices=args.target_vertices,
+                                         max_error=args.max_error, format=args.format, workers=args.workers,
+                                         cache=cache, engine=args.engine, quadrics=args.quadrics, verify=args.verify,
+                                         stats=stats, checkpoint=checkpoint, resume=args.resume,
+                                         preview=preview)
+    except topology.TopologyChanged as e:
+        print(e)
+        return
+    print("n triangles before", stats['input_faces'])
+    print("n triangles after", len(triangulation), "(%.2f s)" % (time.perf_counter() - start))
+    if args.verify:
+        print("topology before", stats['input_topology'])
+        print("topology after", stats['topology'])
+    if preview:
+        print("preview:", preview, "(%.2f s)" % stats['preview_seconds'])
+    if args.homology:
+        print("homology", helpers.homology(triangulation, points))
+    if args.plot:
+        helpers.plot(triangulation, points)
 
-triangulation,points=edge_contraction.edge_contraction(graph,triangulation,points)
-#data.save_ply("bunny/simplified/bun_zipper_2" + res[3] + ".ply", triangulation, points)
-helpers.plot(triangulation, points)
 
-print("n triangles:", len(triangulation))
-print("homology", helpers.homology(triangulation, points))
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,349 @@
+"""
+    Compact array-backed triangle mesh (corner table).
+
+    Triangles are stored in an (F, 3) int32 array. Corner 3 * f + i is the i-th vertex of triangle f and
+    'opposite' holds, for every corner, the corner of the neighbouring triangle across the edge opposite to it
+    (-1 on the boundary). Each vertex keeps one of its corners, from which its star is found by walking from
+    triangle to triangle across the edges incident to the vertex. Contracted triangles and vertices are not
+    removed from the arrays, they are only marked as dead (tombstones).
+
+    The mesh implements the part of the networkx.Graph interface used by the edge contraction algorithm
+    (nodes, edges, neighbors, has_edge, ...), so link_of_node, link_of_edge and is_safe work with it unchanged.
+
+    Vertices at non-manifold edges or with more than one fan of triangles are marked non-manifold. Their stars
+    are found by scanning the triangle array instead.
+"""
+import numpy as np
+
+from link_condition import adjacency
+
+ALIVE = 1
+NON_MANIFOLD = 2
+
+
+class CompactMesh:
+
+    def __init__(self, faces, n_points):
+        """ 'faces' is (F, 3) array of vertex indices of triangles, 'n_points' the number of vertices. """
+        self.faces = np.array(faces, dtype=np.int32).reshape(-1, 3)
+        self.opposite = np.full(3 * len(self.faces), -1, dtype=np.int32)
+        self.corner = np.full(n_points, -1, dtype=np.int32)
+        self.valence = np.zeros(n_points, dtype=np.int32)
+        self.flags = np.full(n_points, ALIVE, dtype=np.uint8)
+        self.n_vertices = n_points
+        self.n_faces = len(self.faces)
+        self.size = n_points
+
+        # triangles around non-manifold vertices and stars found since the last contraction
+        self.fans = {}
+        self.stars = {}
+
+        if self.n_faces:
+            self._build()
+
+    def _build(self):
+        corners = self.faces.ravel()
+        self.corner[corners] = np.arange(len(corners), dtype=np.int32)
+        self.valence[:] = np.bincount(corners, minlength=self.size)
+
+        # edge opposite to corner i is formed by the other two vertices of the triangle
+        edges = np.sort(self.faces[:, [1, 2, 0, 2, 0, 1]].reshape(-1, 2), axis=1).astype(np.int64)
+        keys = edges[:, 0] * self.size + edges[:, 1]
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        counts = np.diff(np.r_[starts, len(keys)])
+
+        pairs = starts[counts == 2]
+        first, second = order[pairs], order[pairs + 1]
+        self.opposite[first] = second
+        self.opposite[second] = first
+
+        # edges with more than two triangles stay without opposite corners
+        crowded = np.repeat(counts > 2, counts)
+        self.flags[edges[order[crowded]].ravel()] |= NON_MANIFOLD
+
+        flagged = np.flatnonzero(self.flags[corners] & NON_MANIFOLD)
+        for v, f in zip(corners[flagged].tolist(), (flagged // 3).tolist()):
+            self.fans.setdefault(v, set()).add(f)
+
+    # --- networkx.Graph interface ---
+
+    def nodes(self):
+        return np.flatnonzero(self.flags[:self.size] & ALIVE).tolist()
+
+    def number_of_nodes(self):
+        return self.n_vertices
+
+    def has_node(self, v):
+        return 0 <= v < self.size and bool(self.flags[v] & ALIVE)
+
+    def neighbors(self, v):
+        return iter(self.neighbor_set(v))
+
+    def has_edge(self, a, b):
+        return self.has_node(a) and b in self.neighbor_set(a)
+
+    def edges(self, v=None):
+        if v is not None:
+            return [(v, x) for x in self.neighbor_set(v)]
+        edges = self.edge_array()
+        return list(zip(edges[:, 0].tolist(), edges[:, 1].tolist()))
+
+    def number_of_edges(self):
+        return len(self.edge_array())
+
+    # --- mesh queries ---
+
+    def edge_array(self):
+        """ (E, 2) array of sorted edges of live triangles. """
+        faces = self.faces[self.faces[:, 0] >= 0].astype(np.int64)
+        edges = np.sort(faces[:, [0, 1, 1, 2, 0, 2]].reshape(-1, 2), axis=1)
+        keys = np.unique(edges[:, 0] * self.size + edges[:, 1])
+        return np.stack([keys // self.size, keys % self.size], axis=1)
+
+    def triangle_array(self):
+        """ (F, 3) array of live triangles. """
+        return self.faces[self.faces[:, 0] >= 0]
+
+    def triangles(self):
+        """ List of live triangles as sorted tuples. """
+        return [tuple(sorted(t)) for t in self.triangle_array().tolist()]
+
+    def number_of_faces(self):
+        return self.n_faces
+
+    def star(self, v):
+        """ List of indices of triangles incident to the vertex 'v'. """
+        star = self.stars.get(v)
+        if star is not None:
+            return star
+        if not self.has_node(v) or self.corner[v] < 0:
+            return []
+
+        if self.flags[v] & NON_MANIFOLD:
+            star = list(self.fans[v])
+        else:
+            star = self._walk(v)
+            if len(star) != self.valence[v]:
+                # the walk from one corner did not reach all triangles: more than one fan
+                self._mark_non_manifold(v)
+                star = list(self.fans[v])
+        self.stars[v] = star
+        return star
+
+    def _mark_non_manifold(self, v):
+        self.flags[v] |= NON_MANIFOLD
+        self.fans[v] = set(np.flatnonzero((self.faces == v).any(axis=1)).tolist())
+
+    def _walk(self, v):
+        opposite = self.opposite
+        c0 = int(self.corner[v])
+        f0, i0 = divmod(c0, 3)
+        star = [f0]
+
+        # walk in one direction and, if a boundary is reached, in the other
+        for k0 in ((i0 + 1) % 3, (i0 + 2) % 3):
+            f, i, k = f0, i0, k0
+            while True:
+                o = opposite[3 * f + k]
+                if o < 0:
+                    break
+                f, j = divmod(int(o), 3)
+                if f == f0:
+                    return star
+                star.append(f)
+                i = self._local(f, v)
+                # we came over the edge opposite to corner j, so continue over the one opposite to the third corner
+                k = 3 - i - j
+        return star
+
+    def _local(self, f, v):
+        row = self.faces[f]
+        return 0 if row[0] == v else 1 if row[1] == v else 2
+
+    def neighbor_set(self, v):
+        neighbors = set(self.faces[self.star(v)].ravel().tolist())
+        neighbors.discard(v)
+        return neighbors
+
+    def incident_triangles(self, v):
+        """ Set of triangles (sorted tuples) incident to the vertex 'v'. """
+        return set(tuple(sorted(t)) for t in self.faces[self.star(v)].tolist())
+
+    def incidence(self):
+        return MeshIncidence(self)
+
+    def adjacency(self):
+        """ Compressed sparse row adjacency (indptr, indices) of the live edges, see link_condition.adjacency. """
+        return adjacency(self.edge_array(), self.size)
+
+    # --- modification ---
+
+    def can_collapse(self, a, b):
+        """ Check if the edge (a, b) is shared by exactly two triangles and triangles (a, x, y) and (b, x, y) over its
+            link {x, y} do not both exist (contracting it would produce a duplicate triangle). """
+        star_a, star_b = set(self.star(a)), set(self.star(b))
+        shared = star_a.intersection(star_b)
+        if len(shared) != 2:
+            return False
+        link = set(self.faces[list(shared)].ravel().tolist()) - {a, b}
+        spanning = [t for t in self.faces[list(star_a.symmetric_difference(star_b))].tolist() if link.issubset(t)]
+        return len(spanning) < 2
+
+    def collapse(self, a, b, c):
+        """ Contracts the edge (a, b) into the new vertex 'c'. Should only be called if can_collapse(a, b).
+
+            Triangles with both 'a' and 'b' are removed and 'a', 'b' are replaced with 'c' in the other triangles
+            around them. Only the opposite corners over the edges incident to 'c' change, so they are paired again
+            from the triangles around 'c'. """
+        self._reserve(c + 1)
+        faces, opposite, fans = self.faces, self.opposite, self.fans
+        star = set(self.star(a)).union(self.star(b))
+        self.stars.clear()
+        shared, rest, link, crowded = [], [], [], []
+
+        for f in star:
+            row = faces[f].tolist()
+            if a in row and b in row:
+                shared.append(f)
+                link.extend(x for x in row if x != a and x != b)
+                for x in row:
+                    if x in fans:
+                        fans[x].discard(f)
+            else:
+                rest.append(f)
+
+        for f in shared:
+            faces[f] = -1
+            opposite[3 * f:3 * f + 3] = -1
+        for x in link:
+            self.valence[x] -= 1
+
+        # corners opposite to the edges (c, x), grouped by x, and a corner of every vertex of the remaining triangles
+        over, around = {}, {}
+        for f in rest:
+            row = faces[f]
+            row[(row == a) | (row == b)] = c
+            row = row.tolist()
+            for j, x in enumerate(row):
+                around.setdefault(x, 3 * f + j)
+            i = row.index(c)
+            for k in ((i + 1) % 3, (i + 2) % 3):
+                over.setdefault(row[3 - i - k], []).append(3 * f + k)
+
+        for x, corners in over.items():
+            if len(corners) == 2:
+                opposite[corners[0]], opposite[corners[1]] = corners[1], corners[0]
+            else:
+                opposite[corners] = -1
+                if len(corners) > 2:
+                    crowded.append(x)
+
+        non_manifold = (self.flags[a] | self.flags[b]) & NON_MANIFOLD or crowded
+        for v in (a, b):
+            self.flags[v] = 0
+            self.corner[v] = -1
+            self.valence[v] = 0
+            fans.pop(v, None)
+
+        self.flags[c] = ALIVE
+        self.valence[c] = len(rest)
+        self.corner[c] = 3 * rest[0] + self._local(rest[0], c) if rest else -1
+        if non_manifold:
+            self.flags[c] |= NON_MANIFOLD
+            fans[c] = set(rest)
+        for x in crowded:
+            if x not in fans:
+                self._mark_non_manifold(x)
+
+        # link vertices may have kept a corner of a removed triangle
+        for x in link:
+            if faces[self.corner[x] // 3, 0] < 0:
+                self.corner[x] = self._new_corner(x, around)
+
+        self.n_faces -= len(shared)
+        self.n_vertices -= 1
+
+    def _new_corner(self, v, around):
+        """ Corner of the vertex 'v' whose corner was in a removed triangle. It is taken from 'around' (corners in the
+            triangles around the new vertex), the fans of a non-manifold vertex or is -1 if 'v' has no triangles left.
+            Only a vertex with another fan of triangles, not yet found to be non-manifold, needs a scan of all
+            triangles. """
+        if v in around:
+            return around[v]
+        if self.valence[v] == 0:
+            return -1
+        if self.fans.get(v):
+            f = next(iter(self.fans[v]))
+            return 3 * f + self._local(f, v)
+        corners = np.flatnonzero(self.faces.ravel() == v)
+        return corners[0] if len(corners) else -1
+
+    def _reserve(self, size):
+        """ Makes room for vertices with indices smaller than 'size'. """
+        if size > len(self.corner):
+            capacity = max(size, 2 * len(self.corner))
+            self.corner = np.resize(self.corner, capacity)
+            self.valence = np.resize(self.valence, capacity)
+            self.flags = np.resize(self.flags, capacity)
+            self.corner[self.size:] = -1
+            self.valence[self.size:] = 0
+            self.flags[self.size:] = 0
+        self.size = max(self.size, size)
+
+    def nbytes(self):
+        """ Memory used by the mesh arrays in bytes. """
+        return sum(a.nbytes for a in (self.faces, self.opposite, self.corner, self.valence, self.flags))
+
+    def arrays(self):
+        """ Dict of arrays with the whole state of the mesh, see from_arrays. """
+        fans = [(v, f) for v, triangles in self.fans.items() for f in triangles]
+        return {
+            'faces': self.faces,
+            'opposite': self.opposite,
+            'corner': self.corner[:self.size],
+            'valence': self.valence[:self.size],
+            'flags': self.flags[:self.size],
+            'counts': np.array([self.n_vertices, self.n_faces, self.size], dtype=np.int64),
+            'fan_vertices': np.array(list(self.fans), dtype=np.int64),
+            'fans': np.array(fans, dtype=np.int64).reshape(-1, 2),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """ CompactMesh with the state from the dict of arrays made by arrays(). """
+        mesh = cls(np.zeros((0, 3)), 0)
+        mesh.faces = np.array(arrays['faces'], dtype=np.int32).reshape(-1, 3)
+        mesh.opposite = np.array(arrays['opposite'], dtype=np.int32)
+        mesh.corner = np.array(arrays['corner'], dtype=np.int32)
+        mesh.valence = np.array(arrays['valence'], dtype=np.int32)
+        mesh.flags = np.array(arrays['flags'], dtype=np.uint8)
+        mesh.n_vertices, mesh.n_faces, mesh.size = arrays['counts'].tolist()
+        mesh.fans = {v: set() for v in arrays['fan_vertices'].tolist()}
+        for v, f in arrays['fans'].tolist():
+            mesh.fans[v].add(f)
+        return mesh
+
+
+class MeshIncidence:
+    """ View of the mesh with the interface of the vertex -> set of incident triangles dict of edge_contraction. """
+
+    def __init__(self, mesh):
+        self.mesh = mesh
+
+    def get(self, v, default=None):
+        triangles = self.mesh.incident_triangles(v)
+        return triangles if triangles else default
+
+    def __getitem__(self, v):
+        return self.mesh.incident_triangles(v)
+
+    def __contains__(self, v):
+        return self.mesh.has_node(v) and self.mesh.valence[v] > 0
+
+
+def triangulation_to_mesh(triangulation, points):
+    """ Like helpers.triangulation_to_graph, but returns CompactMesh. """
+    return CompactMesh(np.array(triangulation, dtype=np.int32).reshape(-1, 3), len(points))
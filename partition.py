@@ -0,0 +1,163 @@
+"""
+    Partitioned edge contraction for large meshes.
+
+    Triangles are split into cells of a regular grid by their centroids. Vertices used by triangles of more than
+    one cell lie on a seam and are locked, so the stars of all other vertices are completely inside their cell and
+    the interiors of the cells are simplified independently in separate processes. Contracting an edge with both
+    vertices unlocked changes only triangles of its own cell, so is_safe decides exactly as it would on the whole
+    mesh. The simplified cells are stitched together over the locked vertices and a final pass of edge contraction
+    over the stitched mesh removes the remaining triangles along the seams.
+
+    The cells stop at SLACK times their share of the targets, so the final pass still picks the cheapest edges of the
+    whole mesh instead of the cells taking their last, most expensive edges next to the locked seams. The quadrics
+    are packed vertex quadrics (see quadrics.VertexQuadrics): the cells return the quadrics of their vertices, which
+    the final pass starts from, so it sees the error the cells made. A seam vertex gets the sum of its quadrics from
+    all cells, which is the quadric of all its triangles.
+
+    At most two cells per worker are sent to the processes at a time, the others wait as triangles of the input.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+
+from edge_contraction import contract_edges, contraction_result, edge_arrays, edge_queue, face_target, \
+    unique_edges, vertex_quadric_array
+from helpers import compact_vertices
+from mesh import CompactMesh
+from quadrics import VertexQuadrics
+
+# cells keep this many times their share of the targets for the final pass
+SLACK = 2
+
+
+def simplify_partitioned(triangulation, points, workers=None, cells=None, target_faces=None, target_vertices=None,
+                         target_ratio=None, max_error=None):
+    """ Simplifies the triangulation like edge_contraction with targets split between cells of the grid.
+        'cells' is the number of grid cells along each axis (by default enough for two cells per worker).
+        Returns list of triangles and list of points (compacted). """
+    workers = workers or os.cpu_count() or 1
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    faces = np.asarray(triangulation, dtype=np.int64).reshape(-1, 3)
+    n_faces = len(faces)
+    if cells is None:
+        cells = int(np.ceil((2 * workers) ** (1 / 3)))
+    target_faces = face_target(n_faces, target_faces, target_ratio)
+
+    cell = face_cells(points, faces, cells)
+    locked = seam_vertices(faces, cell, len(points))
+
+    def jobs():
+        for k in np.unique(cell):
+            cell_faces = faces[cell == k]
+            share = SLACK * len(cell_faces) / n_faces
+            options = {
+                'target_faces': None if target_faces is None else int(round(target_faces * share)),
+                'target_vertices': None if target_vertices is None else int(round(target_vertices * share)),
+                'max_error': max_error,
+            }
+            yield cell_faces, options
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        running = {}
+        for k, (cell_faces, options) in enumerate(jobs()):
+            if len(running) >= 2 * workers:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    k_done, cell_seam = running.pop(future)
+                    results[k_done] = cell_seam, future.result()
+            used = np.unique(cell_faces)
+            future = executor.submit(simplify_cell, *cell_job(cell_faces, points, locked), options)
+            running[future] = k, used[locked[used]]
+        for future, (k, cell_seam) in running.items():
+            results[k] = cell_seam, future.result()
+
+    # stitched in the order of the cells, so the result does not depend on which process finished first
+    faces, stitched_points, vertex_q = stitch([results[k] for k in sorted(results)], points, locked)
+
+    # final pass over the whole stitched mesh, where mostly the seams are left to simplify
+    graph, all_points, _ = contract_mesh(faces, stitched_points, vertex_q, target_faces=target_faces,
+                                         target_vertices=target_vertices, max_error=max_error)
+    return contraction_result(graph, None, all_points)
+
+
+def face_cells(points, faces, cells):
+    """ Index of the grid cell of every triangle's centroid for a grid with 'cells' cells along each axis. """
+    centroids = points[faces].mean(axis=1)
+    low, high = points.min(axis=0), points.max(axis=0)
+    extent = np.where(high > low, high - low, 1)
+    index = np.clip(((centroids - low) / extent * cells).astype(np.int64), 0, cells - 1)
+    return (index[:, 0] * cells + index[:, 1]) * cells + index[:, 2]
+
+
+def seam_vertices(faces, cell, n_points):
+    """ Boolean mask of vertices used by triangles from more than one cell. """
+    corner_cell = np.repeat(cell, 3)
+    lowest = np.full(n_points, np.iinfo(np.int64).max)
+    highest = np.full(n_points, -1)
+    np.minimum.at(lowest, faces.ravel(), corner_cell)
+    np.maximum.at(highest, faces.ravel(), corner_cell)
+    return (highest >= 0) & (lowest != highest)
+
+
+def cell_job(cell_faces, points, locked):
+    """ Renumbers the triangles of one cell. Returns the local triangles, points and indices of locked vertices. """
+    local_faces, local_points, mapping = compact_vertices(cell_faces, points)
+    used = mapping >= 0
+    local_locked = mapping[used & locked]
+    return local_faces, local_points, local_locked
+
+
+def contract_mesh(faces, points, vertex_q, locked=(), target_faces=None, target_vertices=None, max_error=None):
+    """ Edge contraction of (F, 3) triangles over (N, 3) points like edge_contraction with 'packed' quadrics, but
+        starting from the (N, 10) packed vertex quadrics 'vertex_q'. Returns the CompactMesh, list of all points and
+        the VertexQuadrics of all points. """
+    graph = CompactMesh(faces, len(points))
+    quadrics = VertexQuadrics.from_packed(vertex_q)
+    edges = unique_edges(faces, len(points))
+    queue, edge_coordinate = edge_queue(edges, *edge_arrays(edges, quadrics, points))
+    points = points.tolist()
+    contract_edges(graph, None, graph.incidence(), points, quadrics, queue, edge_coordinate, target_faces=target_faces,
+                   target_vertices=target_vertices, max_error=max_error, locked=set(locked))
+    return graph, points, quadrics
+
+
+def simplify_cell(faces, points, locked, options):
+    """ Worker: simplifies one cell with its seam vertices locked. Returns the triangles, points, their packed
+        quadrics and new indices of the locked vertices (-1 if a locked vertex was dropped). """
+    graph, all_points, quadrics = contract_mesh(faces, points, vertex_quadric_array(points, faces),
+                                                locked=locked.tolist(), **options)
+    faces, points, mapping = compact_vertices(graph.triangles(), all_points)
+    return faces, points, quadrics.packed[:len(quadrics)][mapping >= 0], mapping[locked]
+
+
+def stitch(results, points, locked):
+    """ Joins the simplified cells, given as pairs of the original indices of the locked vertices of the cell (in
+        the order used by cell_job) and the result of simplify_cell. Locked vertices come first (in their original
+        order) and are shared between cells, the remaining vertices of every cell follow. Returns the triangles,
+        points and packed quadrics, where the quadric of a locked vertex is the sum of its quadrics from all cells. """
+    seam = np.flatnonzero(locked)
+    slot = np.full(len(points), -1)
+    slot[seam] = np.arange(len(seam))
+
+    all_points = [points[seam]]
+    all_faces = []
+    seam_q = np.zeros((len(seam), 10))
+    all_q = [seam_q]
+    offset = len(seam)
+    for cell_seam, (faces, cell_points, cell_q, locked_new) in results:
+        index = np.full(len(cell_points), -1)
+        kept = locked_new >= 0
+        index[locked_new[kept]] = slot[cell_seam[kept]]
+        seam_q[slot[cell_seam[kept]]] += cell_q[locked_new[kept]]
+
+        free = index < 0
+        index[free] = offset + np.arange(free.sum())
+        offset += free.sum()
+
+        all_points.append(cell_points[free])
+        all_q.append(cell_q[free])
+        all_faces.append(index[faces])
+
+    return (np.concatenate(all_faces).reshape(-1, 3), np.concatenate(all_points).reshape(-1, 3),
+            np.concatenate(all_q))
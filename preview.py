@@ -0,0 +1,126 @@
+"""
+    Preview images of triangulations, without a display.
+
+    The triangles are projected orthographically with array operations and drawn as one flat shaded PolyCollection,
+    far triangles first, on a matplotlib Figure with the Agg canvas. No window or interactive backend is needed and
+    pyplot is never imported, so previews can be made in batch jobs. Triangulations with more than 'max_faces'
+    triangles are first reduced by vertex clustering (see cluster_vertices).
+
+    The y axis points up, as in the Stanford scans.
+
+        save_preview(triangulation, points, 'bunny.png')
+        save_before_after((triangulation, points), (simplified, simplified_points), 'bunny_before_after.png')
+"""
+import numpy as np
+
+# light from the upper left front in view coordinates and the colour of a fully lit triangle
+LIGHT = np.array([-0.4, 0.5, 1.0]) / np.linalg.norm([-0.4, 0.5, 1.0])
+COLOR = np.array([0.62, 0.70, 0.85])
+AMBIENT = 0.25
+
+
+def save_preview(triangulation, points, filename, size=256, max_faces=10000, elevation=15, azimuth=-20):
+    """ Writes 'size' x 'size' pixels PNG image of the triangulation to 'filename'. Triangulations with more than
+        'max_faces' triangles are reduced first. The view is turned by 'azimuth' degrees around the vertical axis and
+        tilted by 'elevation' degrees. """
+    figure, axes = figure_axes(1, size)
+    draw(axes[0], triangulation, points, max_faces, elevation, azimuth)
+    figure.savefig(filename)
+
+
+def save_before_after(before, after, filename, size=256, max_faces=10000, elevation=15, azimuth=-20):
+    """ Writes PNG image with previews of the triangulations 'before' and 'after' side by side, each 'size' pixels
+        wide. 'before' and 'after' are pairs of triangles and points, the other arguments are as in save_preview. """
+    figure, axes = figure_axes(2, size)
+    for ax, (triangulation, points), name in zip(axes, (before, after), ('before', 'after')):
+        shown = draw(ax, triangulation, points, max_faces, elevation, azimuth)
+        title = "%s: %d triangles" % (name, len(triangulation))
+        if shown < len(triangulation):
+            title += " (%d shown)" % shown
+        ax.set_title(title, fontsize=7)
+    figure.savefig(filename)
+
+
+def figure_axes(columns, size):
+    """ Figure with the Agg canvas and 'columns' axes of 'size' x 'size' pixels next to each other. """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    dpi = 100
+    figure = Figure(figsize=(columns * size / dpi, size / dpi), dpi=dpi)
+    FigureCanvasAgg(figure)
+    axes = [figure.add_axes([i / columns, 0, 1 / columns, 0.92 if columns > 1 else 1]) for i in range(columns)]
+    return figure, axes
+
+
+def draw(ax, triangulation, points, max_faces=10000, elevation=15, azimuth=-20):
+    """ Draws the triangulation on the axes. Returns the number of drawn triangles. """
+    from matplotlib.collections import PolyCollection
+
+    faces = np.asarray(triangulation, dtype=np.int64).reshape(-1, 3)
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    ax.set_axis_off()
+    if len(faces) == 0:
+        return 0
+    if len(faces) > max_faces:
+        faces, points = cluster_vertices(faces, points, max_faces)
+
+    corners = (points @ view_rotation(elevation, azimuth).T)[faces]
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    length = np.sqrt(np.einsum('ij,ij->i', normals, normals))
+    # both sides of a triangle are lit, the orientation of triangles in scans is not reliable
+    shade = np.divide(np.abs(normals @ LIGHT), length, out=np.zeros(len(faces)), where=length > 0)
+    colors = COLOR * (AMBIENT + (1 - AMBIENT) * shade)[:, None]
+
+    # painter's algorithm: the viewer looks along -z, so triangles with smaller depth are drawn first
+    order = np.argsort(corners[:, :, 2].mean(axis=1), kind='stable')
+    ax.add_collection(PolyCollection(corners[order, :, :2], facecolors=colors[order], edgecolors=colors[order],
+                                     linewidths=0.2))
+
+    low, high = corners[:, :, :2].reshape(-1, 2).min(axis=0), corners[:, :, :2].reshape(-1, 2).max(axis=0)
+    margin = 0.05 * (high - low).max()
+    ax.set_xlim(low[0] - margin, high[0] + margin)
+    ax.set_ylim(low[1] - margin, high[1] + margin)
+    ax.set_aspect('equal')
+    return len(faces)
+
+
+def view_rotation(elevation, azimuth):
+    """ Rotation of world coordinates into view coordinates (x right, y up, z towards the viewer). """
+    a, e = np.radians(azimuth), np.radians(elevation)
+    turn = np.array([[np.cos(a), 0, np.sin(a)], [0, 1, 0], [-np.sin(a), 0, np.cos(a)]])
+    tilt = np.array([[1, 0, 0], [0, np.cos(e), -np.sin(e)], [0, np.sin(e), np.cos(e)]])
+    return tilt @ turn
+
+
+def cluster_vertices(faces, points, max_faces):
+    """ Reduces the triangulation to at most 'max_faces' triangles (or as few as a single cell gives) by vertex
+        clustering: the bounding box is split into a grid of cells, the points in every cell are merged into their
+        mean and triangles with two corners in one cell are dropped. The grid is made coarser until the triangles
+        fit. Returns (F, 3) array of triangles and (N, 3) array of points. """
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    used, corners = np.unique(faces, return_inverse=True)
+    corners = corners.reshape(-1, 3)
+    low = points[used].min(axis=0)
+    extent = (points[used].max(axis=0) - low).max() or 1.0
+
+    # a surface in a grid of r x r x r cells keeps about r * r triangles
+    resolution = max(int(np.sqrt(max_faces)), 1)
+    while True:
+        cells = np.minimum(((points[used] - low) / extent * resolution).astype(np.int64), resolution - 1)
+        keys = (cells[:, 0] * resolution + cells[:, 1]) * resolution + cells[:, 2]
+        _, cluster = np.unique(keys, return_inverse=True)
+        m = cluster.max() + 1
+        clustered = np.sort(cluster.ravel()[corners], axis=1)
+        clustered = clustered[(clustered[:, 0] != clustered[:, 1]) & (clustered[:, 1] != clustered[:, 2])]
+        keys = np.unique((clustered[:, 0] * m + clustered[:, 1]) * m + clustered[:, 2])
+        clustered = np.stack([keys // (m * m), keys // m % m, keys % m], axis=1)
+        if len(clustered) <= max_faces or resolution == 1:
+            break
+        resolution = max(min(resolution - 1, int(resolution * np.sqrt(max_faces / len(clustered)))), 1)
+
+    cluster = cluster.ravel()
+    counts = np.bincount(cluster)
+    centers = np.stack([np.bincount(cluster, weights=points[used, j]) for j in range(3)], axis=1) / counts[:, None]
+    return clustered, centers
@@ -0,0 +1,42 @@
+"""
+    Cumulative timers of the phases of the edge contraction loop.
+
+    The loop calls lap(phase) after every phase, which adds the time since the previous lap to that phase.
+    When profiling is off the loop gets NULL_TIMER, whose methods do nothing, so the only cost is an empty call.
+"""
+import time
+
+
+class PhaseTimer:
+
+    def __init__(self, seconds=None):
+        """ Times are added to the 'seconds' dict (phase -> seconds), a new one is made if not given. """
+        self.seconds = {} if seconds is None else seconds
+        self.last = time.perf_counter()
+
+    def start(self):
+        """ Starts measuring the next phase from now (time since the last lap is not counted anywhere). """
+        self.last = time.perf_counter()
+
+    def lap(self, phase):
+        """ Adds the time since the last lap or start to the phase. """
+        now = time.perf_counter()
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + now - self.last
+        self.last = now
+
+
+class NullTimer:
+
+    def start(self):
+        pass
+
+    def lap(self, phase):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+def phase_timer(seconds):
+    """ PhaseTimer adding to the 'seconds' dict or NULL_TIMER if it is None. """
+    return NULL_TIMER if seconds is None else PhaseTimer(seconds)
@@ -0,0 +1,127 @@
+"""
+    Progressive mesh: the sequence of edge contractions of one simplification run.
+
+    Every triangle that exists at some point of the run gets an index. Triangles of the input come first, triangles
+    made by the contractions follow in the order they were made. Step k is the triangulation after the first k
+    contractions and a triangle is part of it if it was made at a step <= k (born) and removed at a step > k (died).
+    Extracting any level of detail, coarser or finer than the current one, is then a single comparison over the
+    birth and death arrays, without running the contractions again.
+
+    The run is saved to an .npz file with arrays:
+    - points: (N, 3) coordinates of the input points followed by the new point of every contraction,
+    - faces: (T, 3) all triangles,
+    - birth, death: (T,) steps at which triangles were made and removed (death is the number of steps + 1 for
+      triangles never removed),
+    - collapses: (K, 3) vertices a, b of the contracted edge and the new vertex c of every step.
+"""
+import numpy as np
+
+from edge_contraction import edge_contraction
+from helpers import compact_vertices
+
+
+class CollapseRecord:
+    """ Records the contractions made by edge_contraction (see its 'record' argument). """
+
+    def __init__(self):
+        self.faces = []
+        self.birth = []
+        self.death = []
+        self.collapses = []
+        self.alive = {}
+
+    def start(self, triangles):
+        """ Called with the triangles (sorted tuples) before the first contraction. """
+        for t in triangles:
+            self.add_triangle(t, 0)
+
+    def collapse(self, edge, c, removed_triangles, added_triangles):
+        """ Called after every contraction with the triangles removed and added by contract. """
+        self.collapses.append((edge[0], edge[1], c))
+        step = len(self.collapses)
+        for t in dict.fromkeys(removed_triangles):
+            index = self.alive.pop(t, None)
+            if index is not None:
+                self.death[index] = step
+        for t in dict.fromkeys(added_triangles):
+            if t not in self.alive:
+                self.add_triangle(t, step)
+
+    def add_triangle(self, t, step):
+        self.alive[t] = len(self.faces)
+        self.faces.append(t)
+        self.birth.append(step)
+        self.death.append(-1)
+
+    def progressive_mesh(self, points):
+        """ ProgressiveMesh of the recorded run. 'points' is the list of points after the run (with new points). """
+        death = np.array(self.death, dtype=np.int32)
+        death[death < 0] = len(self.collapses) + 1
+        return ProgressiveMesh(np.asarray(points, dtype=float).reshape(-1, 3),
+                               np.array(self.faces, dtype=np.int32).reshape(-1, 3),
+                               np.array(self.birth, dtype=np.int32), death,
+                               np.array(self.collapses, dtype=np.int32).reshape(-1, 3))
+
+
+class ProgressiveMesh:
+
+    def __init__(self, points, faces, birth, death, collapses):
+        self.points = points
+        self.faces = faces
+        self.birth = birth
+        self.death = death
+        self.collapses = collapses
+
+        # number of triangles after every step
+        steps = len(collapses) + 2
+        born = np.cumsum(np.bincount(birth, minlength=steps))
+        died = np.cumsum(np.bincount(death, minlength=steps))
+        self.face_counts = (born - died)[:len(collapses) + 1]
+
+    def number_of_steps(self):
+        return len(self.collapses)
+
+    def alive(self, step):
+        """ Boolean mask of triangles of the triangulation after 'step' contractions. """
+        return (self.birth <= step) & (self.death > step)
+
+    def step_for_faces(self, target_faces):
+        """ First step with at most 'target_faces' triangles (the last step if there is no such step). """
+        steps = np.flatnonzero(self.face_counts <= target_faces)
+        return int(steps[0]) if len(steps) else self.number_of_steps()
+
+    def extract(self, step=None, target_faces=None, compact=True):
+        """ Triangulation after 'step' contractions or at the first step with at most 'target_faces' triangles
+            (the final one if neither is given). Returns (F, 3) array of triangles and (N, 3) array of points.
+            With 'compact' only the points of the triangles are returned, see helpers.compact_vertices. """
+        if step is None:
+            step = self.step_for_faces(target_faces) if target_faces is not None else self.number_of_steps()
+        if not 0 <= step <= self.number_of_steps():
+            raise ValueError("Step should be between 0 and %d." % self.number_of_steps())
+        faces = self.faces[self.alive(step)]
+        if compact:
+            faces, points, _ = compact_vertices(faces, self.points)
+            return faces, points
+        return faces, self.points
+
+    def changes(self, step, new_step):
+        """ Indices of triangles removed and added when going from 'step' to 'new_step' (in either direction). """
+        before, after = self.alive(step), self.alive(new_step)
+        return np.flatnonzero(before & ~after), np.flatnonzero(after & ~before)
+
+    def save(self, filename):
+        np.savez(filename, points=self.points, faces=self.faces, birth=self.birth, death=self.death,
+                 collapses=self.collapses)
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as arrays:
+            return cls(arrays['points'], arrays['faces'], arrays['birth'], arrays['death'], arrays['collapses'])
+
+
+def progressive_mesh(graph, triangulation, points, **options):
+    """ Runs edge_contraction (with 'options') and returns ProgressiveMesh of the run. Without targets the edges are
+        contracted while it is safe, so every coarser level can be extracted later. """
+    record = CollapseRecord()
+    edge_contraction(graph, triangulation, points, compact=False, record=record, **options)
+    return record.progressive_mesh(points)
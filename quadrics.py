@@ -0,0 +1,89 @@
+"""
+    Packed storage of vertex quadrics.
+
+    A quadric is a symmetric 4x4 matrix, so the 10 entries of its upper triangle are enough to keep it.
+    VertexQuadrics keeps the quadrics of all vertices in one contiguous (N, 10) array of float64 or float32 instead
+    of the dict of 4x4 arrays keyed by tuples (see edge_contraction.quadrics_dict). Quadrics of edges and triangles
+    are not kept at all: the quadric of a triangle is computed from its points when it is needed and the quadric of an
+    edge is the sum of the quadrics of its triangles. The dict keeps the quadric of an edge from when the edge was
+    made instead, so the contracted edges differ (see the 'quadrics' argument of edge_contraction).
+"""
+import numpy as np
+
+from helpers import sorted_tuple, triangle_quadrics
+
+# entries of the upper triangle in the packed order and the packed index of every entry of the 4x4 matrix
+UPPER = np.triu_indices(4)
+PACKED_INDEX = np.zeros((4, 4), dtype=np.int64)
+PACKED_INDEX[UPPER] = np.arange(10)
+PACKED_INDEX[UPPER[1], UPPER[0]] = np.arange(10)
+
+# storage modes of edge_contraction (see its 'quadrics' argument)
+DTYPES = {'packed': np.float64, 'packed32': np.float32}
+
+
+def pack(quadrics):
+    """ (..., 10) upper triangles of (..., 4, 4) symmetric quadrics. """
+    return np.asarray(quadrics)[..., UPPER[0], UPPER[1]]
+
+
+def unpack(packed):
+    """ (..., 4, 4) symmetric float64 quadrics from (..., 10) packed ones. """
+    return np.asarray(packed, dtype=np.float64)[..., PACKED_INDEX]
+
+
+class VertexQuadrics:
+    """ Quadrics of vertices 0 .. N-1 in (N, 10) array. A new vertex gets the next index, like the new point of a
+        contraction, and the array grows by doubling. """
+
+    def __init__(self, vertex_q, dtype=np.float64):
+        vertex_q = np.asarray(vertex_q).reshape(-1, 4, 4)
+        self.length = len(vertex_q)
+        self.packed = np.empty((max(self.length, 1), 10), dtype=dtype)
+        # in blocks, so float64 copies of the whole array are never made for float32 storage
+        for start in range(0, self.length, 2 ** 16):
+            self.packed[start:start + 2 ** 16] = pack(vertex_q[start:start + 2 ** 16])
+
+    @classmethod
+    def from_packed(cls, packed):
+        """ VertexQuadrics of N vertices from (N, 10) array of packed quadrics, like packed[:len(quadrics)]. """
+        quadrics = cls(np.zeros((0, 4, 4)), packed.dtype)
+        quadrics.packed = np.empty((max(len(packed), 1), 10), dtype=packed.dtype)
+        quadrics.packed[:len(packed)] = packed
+        quadrics.length = len(packed)
+        return quadrics
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, vertices):
+        """ Like get, so c_coordinates takes VertexQuadrics instead of (N, 4, 4) array. """
+        return self.get(vertices)
+
+    @property
+    def nbytes(self):
+        return self.packed.nbytes
+
+    def get(self, vertices):
+        """ (K, 4, 4) float64 quadrics of the vertices. """
+        return unpack(self.packed[:self.length][np.asarray(vertices, dtype=np.int64)])
+
+    def append(self, q):
+        """ Adds the quadric of the next vertex and returns its index. """
+        if self.length == len(self.packed):
+            self.packed = np.concatenate([self.packed, np.empty_like(self.packed)])
+        self.packed[self.length] = pack(q)
+        self.length += 1
+        return self.length - 1
+
+    def contract(self, edge, points, removed):
+        """ Adds the quadric Qc = Qa + Qb - Qab of the new point, the last one in 'points'. Qab is the sum of quadrics
+            of the triangles with the edge among the triangles 'removed' by edge_contraction.contract. """
+        a, b = sorted_tuple(*edge)
+        if self.length != len(points) - 1:
+            raise Exception("The new point should be the next vertex.")
+        triangles = [t for t in dict.fromkeys(removed['triangles']) if a in t and b in t]
+        corners = np.array([points[x] for t in triangles for x in t], dtype=float).reshape(-1, 3)
+        edge_q = triangle_quadrics(corners, np.arange(len(corners)).reshape(-1, 3)).sum(axis=0)
+        qa, qb = self.get([a, b])
+        self.append(qa + qb - edge_q)
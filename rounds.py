@@ -0,0 +1,189 @@
+"""
+    Edge contraction in rounds of independent edges.
+
+    Instead of contracting one edge at a time, every round
+    - computes the optimal positions and errors of all edges at once (helpers.c_coordinates),
+    - takes the edges with error below a threshold, which is raised from round to round, that pass is_safe
+      (link_condition.safe_edges) and are shared by exactly two triangles,
+    - selects from them a maximal set of edges whose stars do not share any triangle, cheapest edges first,
+    - contracts all selected edges together with array operations on the triangle array.
+
+    The contractions of one round do not touch each other's triangles, so they can be done in any order. The
+    edges are contracted in a slightly different order than in edge_contraction. Quadrics of triangles are kept from
+    the input and not computed again when their vertices move, so Qa + Qb - Qab only removes the quadrics counted
+    in both Qa and Qb and the vertex quadrics stay sums of triangle quadrics (positive semidefinite).
+"""
+import numpy as np
+
+from edge_contraction import face_target, target_reached, initial_quadric_arrays
+from helpers import c_coordinates, compact_vertices
+from link_condition import adjacency, safe_edges, contains
+
+
+def edge_contraction_rounds(triangulation, points, target_faces=None, target_vertices=None, target_ratio=None,
+                            max_error=None, fraction=0.25, stats=None, compact=True):
+    """ Simplifies the triangulation in rounds of independent edge contractions. Targets are as in
+        edge_contraction. In every round the edges with error at most the 'fraction' quantile of the errors of
+        all edges (and never less than the threshold of the previous round) are considered.
+
+        If 'stats' dict is given, it is updated with the number of rounds, contracted edges in every round and the
+        largest error of a contracted edge. Returns list of triangles (sorted tuples) and list of points, compacted
+        like in edge_contraction unless 'compact' is False. """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    faces = np.unique(np.sort(np.asarray(triangulation, dtype=np.int64).reshape(-1, 3), axis=1), axis=0)
+    target_faces = face_target(len(faces), target_faces, target_ratio)
+
+    vertex_q, _, _, face_q = initial_quadric_arrays(points, faces)
+    n_vertices = len(np.unique(faces))
+    threshold = -np.inf
+    collapses = []
+    largest_error = None
+
+    while not target_reached(len(faces), n_vertices, target_faces, target_vertices):
+        edges, shared, all_edges = edges_with_two_faces(faces, len(points))
+        if len(edges) == 0:
+            break
+        positions, errors = c_coordinates(edges, vertex_q, points)
+
+        threshold = max(threshold, np.quantile(errors, fraction))
+        if max_error is not None:
+            threshold = min(threshold, max_error)
+        candidates = np.flatnonzero(errors <= threshold)
+        candidates = candidates[safe_edges(*adjacency(all_edges, len(points)), edges[candidates])]
+        candidates = candidates[~duplicate_triangle(faces, edges[candidates], shared[candidates], len(points))]
+
+        selected = independent_edges(faces, edges, candidates, errors, len(points))
+        if len(selected) == 0:
+            if threshold >= errors.max() or (max_error is not None and threshold >= max_error):
+                break
+            # nothing cheap enough can be contracted, look at more edges
+            fraction = min(1.0, 2 * fraction)
+            continue
+
+        # do not go below the targets
+        allowed = len(selected)
+        if target_faces is not None:
+            allowed = min(allowed, (len(faces) - target_faces + 1) // 2)
+        if target_vertices is not None:
+            allowed = min(allowed, n_vertices - target_vertices)
+        selected = selected[:max(allowed, 1)]
+
+        points, vertex_q, faces, face_q = contract_independent(points, vertex_q, faces, face_q, edges[selected],
+                                                               shared[selected], positions[selected])
+        n_vertices -= len(selected)
+        collapses.append(len(selected))
+        largest_error = max(largest_error or -np.inf, float(errors[selected].max()))
+
+    if stats is not None:
+        stats.update({'rounds': len(collapses), 'collapses': sum(collapses), 'round_collapses': collapses,
+                      'max_error': largest_error})
+
+    if compact:
+        faces, points, _ = compact_vertices(faces, points)
+    triangles = np.sort(faces, axis=1)
+    return list(zip(*triangles.T.tolist())), points.tolist()
+
+
+def edges_with_two_faces(faces, n):
+    """ Edges (sorted, (E, 2)) shared by exactly two triangles, (E, 2) indices of these triangles and all edges. """
+    face_edges = np.sort(faces[:, [0, 1, 1, 2, 0, 2]].reshape(-1, 2), axis=1)
+    keys = face_edges[:, 0] * n + face_edges[:, 1]
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    counts = np.diff(np.r_[starts, len(keys)])
+    all_edges = np.stack([keys[starts] // n, keys[starts] % n], axis=1)
+    starts = starts[counts == 2]
+
+    edges = np.stack([keys[starts] // n, keys[starts] % n], axis=1)
+    shared = np.stack([order[starts], order[starts + 1]], axis=1) // 3
+    return edges, shared, all_edges
+
+
+def link_vertices(faces, edges, shared):
+    """ The third vertices x, y of the two triangles (a, b, x) and (a, b, y) of every edge. """
+    third = faces[shared].sum(axis=2) - edges.sum(axis=1)[:, None]
+    return third[:, 0], third[:, 1]
+
+
+def duplicate_triangle(faces, edges, shared, n):
+    """ Mask of edges (a, b) with link {x, y} where both triangles (a, x, y) and (b, x, y) exist (contracting such
+        an edge would make two equal triangles, see CompactMesh.can_collapse). """
+    x, y = link_vertices(faces, edges, shared)
+    low, high = np.minimum(x, y), np.maximum(x, y)
+
+    # triangles as (rank of the edge of their two smaller vertices, largest vertex)
+    sorted_faces = np.sort(faces, axis=1)
+    edge_keys, rank = np.unique(sorted_faces[:, 0] * n + sorted_faces[:, 1], return_inverse=True)
+    triangle_keys = np.sort(rank.ravel() * n + sorted_faces[:, 2])
+
+    def exists(v):
+        t = np.sort(np.stack([v, low, high], axis=1), axis=1)
+        pair = t[:, 0] * n + t[:, 1]
+        index = np.minimum(np.searchsorted(edge_keys, pair), len(edge_keys) - 1)
+        return (edge_keys[index] == pair) & contains(triangle_keys, index * n + t[:, 2])
+
+    return exists(edges[:, 0]) & exists(edges[:, 1])
+
+
+def independent_edges(faces, edges, candidates, errors, n):
+    """ Maximal set of candidate edges whose stars (triangles around both vertices) have no common triangle.
+        Contracting such an edge does not change the neighbours of the vertices of the others, so is_safe and
+        the errors of the others stay the same. Edges are taken greedily by increasing error: in every pass an edge
+        is selected if it is the cheapest remaining edge at every triangle of its star.
+        Returns indices of selected edges ordered by error. """
+    if len(candidates) == 0:
+        return candidates
+    candidates = candidates[np.argsort(errors[candidates], kind='stable')]
+
+    # vertex -> triangles
+    corners = faces.ravel()
+    order = np.argsort(corners, kind='stable')
+    starts = np.searchsorted(corners[order], np.arange(n + 1))
+
+    # pairs (candidate, triangle of the star of the candidate)
+    ends = edges[candidates].ravel()
+    counts = starts[ends + 1] - starts[ends]
+    owner = np.repeat(np.repeat(np.arange(len(candidates)), 2), counts)
+    first = np.repeat(starts[ends] - np.cumsum(counts) + counts, counts)
+    star = order[first + np.arange(len(owner))] // 3
+
+    alive = np.ones(len(candidates), dtype=bool)
+    selected = []
+    while alive.any():
+        pairs = alive[owner]
+        # candidates are ordered by error, so the index is the priority
+        best = np.full(len(faces), len(candidates))
+        np.minimum.at(best, star[pairs], owner[pairs])
+        lost = np.bincount(owner[pairs], weights=best[star[pairs]] != owner[pairs], minlength=len(candidates))
+        won = alive & (lost == 0)
+        selected.append(np.flatnonzero(won))
+
+        used = np.zeros(len(faces), dtype=bool)
+        used[star[won[owner]]] = True
+        alive &= np.bincount(owner, weights=used[star], minlength=len(candidates)) == 0
+
+    return candidates[np.sort(np.concatenate(selected))]
+
+
+def contract_independent(points, vertex_q, faces, face_q, edges, shared, positions):
+    """ Contracts independent edges (a, b) into new points at 'positions'. Returns new points, vertex quadrics,
+        triangles and their quadrics (of the input triangles they come from). """
+    n = len(points)
+    c = n + np.arange(len(edges))
+    a, b = edges[:, 0], edges[:, 1]
+
+    # Qc = Qa + Qb - Qab, where Qab is the sum of quadrics of the two triangles of the edge
+    edge_q = face_q[shared[:, 0]] + face_q[shared[:, 1]]
+    points = np.concatenate([points, positions])
+    vertex_q = np.concatenate([vertex_q, vertex_q[a] + vertex_q[b] - edge_q])
+
+    rename = np.arange(n)
+    rename[a] = c
+    rename[b] = c
+    faces = rename[faces]
+
+    removed = np.zeros(len(faces), dtype=bool)
+    removed[shared.ravel()] = True
+    return points, vertex_q, faces[~removed], face_q[~removed]
@@ -0,0 +1,119 @@
+"""
+    Simplification of .ply files.
+
+    Reads the triangulation, contracts edges on CompactMesh (see mesh.py) and writes the result. Nothing here
+    imports matplotlib, networkx or gudhi, so it can run without a display. Previews (see preview.py) need
+    matplotlib, but not a display.
+"""
+import os
+import time
+
+import data
+from cache import QuadricCache
+from checkpoint import Checkpoint, resume as resume_checkpoint
+from edge_contraction import edge_contraction
+from mesh import triangulation_to_mesh
+from topology import TopologyChanged, TopologyTracker, invariants, same_topology
+
+
+def simplify(input, output=None, target=None, target_vertices=None, max_error=None, format='ascii', workers=1,
+             stats=None, cache=None, engine='sequential', quadrics='dict', verify=False, checkpoint=None,
+             resume=False, preview=None):
+    """ Simplifies the triangulation from the .ply file 'input' and writes it to 'output' (if given).
+
+        'target' is the number of triangles to keep if it is at least 1, or the fraction of triangles to keep if it
+        is smaller than 1 (0.1 keeps 10% of triangles). 'target_vertices' and 'max_error' are as in edge_contraction.
+        Without any target edges are contracted while it is safe. With more than one worker the mesh is split
+        between processes (see partition.py).
+
+        'cache' is QuadricCache or the path of its directory, it keeps the initial quadrics of the input for the next
+        run with the same file (not used with more than one worker).
+
+        'engine' is 'sequential' for edge_contraction or 'rounds' for the faster edge_contraction_rounds, which
+        contracts many independent edges at once in a slightly different order (see rounds.py). 'quadrics' is the
+        storage of quadrics of edge_contraction ('dict', 'packed' or 'packed32'), used by the sequential engine
+        in one process.
+
+        With 'verify' the Euler characteristic, connected components and boundary loops (see topology.py) of the
+        result are compared with those of the input, and the sequential engine checks the Euler characteristic after
+        every contraction. A change raises topology.TopologyChanged. The invariants of the input and the result are
+        added to 'stats' as 'input_topology' and 'topology'.
+
+        'checkpoint' is checkpoint.Checkpoint or the name of its file (saved every 60 seconds), the sequential engine
+        in one process saves the state of the contraction to it. With 'resume' an existing checkpoint file is
+        continued instead of starting again (the input is then only used to check the topology).
+
+        'preview' is the name of a PNG file for thumbnails of the triangulation before and after simplification (see
+        preview.save_before_after), the time it takes is added to 'stats' as 'preview_seconds'.
+
+        The number of triangles of the input is added to 'stats' as 'input_faces'. Returns list of triangles and list
+        of points of the simplified triangulation. """
+    options = target_options(target)
+    options.update(target_vertices=target_vertices, max_error=max_error)
+
+    if engine not in ('sequential', 'rounds'):
+        raise ValueError("Unknown engine: {}".format(engine))
+    if checkpoint is not None and (engine != 'sequential' or (workers is not None and workers > 1)):
+        raise ValueError("Checkpoints are only saved by the sequential engine in one process.")
+    if isinstance(checkpoint, str):
+        checkpoint = Checkpoint(checkpoint)
+
+    points, triangulation = data.get_triangulation(input)
+    if stats is not None:
+        stats['input_faces'] = len(triangulation)
+    before = invariants(triangulation) if verify else None
+    original = (triangulation, points)
+    if engine == 'rounds':
+        from rounds import edge_contraction_rounds
+        triangulation, points = edge_contraction_rounds(triangulation, points, stats=stats, **options)
+    elif workers is not None and workers > 1:
+        from partition import simplify_partitioned
+        triangulation, points = simplify_partitioned(triangulation, points, workers=workers, **options)
+    elif resume and checkpoint is not None and os.path.exists(checkpoint.filename):
+        triangulation, points = resume_checkpoint(checkpoint.filename, stats=stats, checkpoint=checkpoint,
+                                                  topology=TopologyTracker() if verify else None)
+    else:
+        if isinstance(cache, str):
+            cache = QuadricCache(cache)
+        graph = triangulation_to_mesh(triangulation, points)
+        triangulation, points = edge_contraction(graph, triangulation, points, stats=stats, cache=cache,
+                                                 quadrics=quadrics, topology=TopologyTracker() if verify else None,
+                                                 checkpoint=checkpoint, **options)
+
+    if verify:
+        after = invariants(triangulation)
+        if stats is not None:
+            stats['input_topology'] = before
+            stats['topology'] = after
+        if not same_topology(before, after):
+            raise TopologyChanged("Simplification of {} changed the topology from {} to {}.".format(
+                input, before, after))
+
+    if output is not None:
+        data.save_ply(output, triangulation, points, format)
+    if preview is not None:
+        from preview import save_before_after
+        start = time.perf_counter()
+        save_before_after(original, (triangulation, points), preview)
+        if stats is not None:
+            stats['preview_seconds'] = time.perf_counter() - start
+    return triangulation, points
+
+
+def target_options(target):
+    """ Keyword arguments of edge_contraction for 'target' (see simplify). """
+    if target is None:
+        return {}
+    if target <= 0:
+        raise ValueError("Target should be positive.")
+    if target < 1:
+        return {'target_ratio': target}
+    if target != int(target):
+        raise ValueError("Target number of triangles should be an integer.")
+    return {'target_faces': int(target)}
+
+
+def ply_files(directory):
+    """ Sorted paths of .ply files in the directory. """
+    names = sorted(name for name in os.listdir(directory) if name.lower().endswith('.ply'))
+    return [os.path.join(directory, name) for name in names if os.path.isfile(os.path.join(directory, name))]
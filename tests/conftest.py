@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the modules are in the root of the repository
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+BUNNY = os.path.join(ROOT, 'bunny', 'reconstruction')
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+import data, helpers
+from checkpoint import Checkpoint, resume
+from conftest import BUNNY
+from edge_contraction import edge_contraction
+from mesh import triangulation_to_mesh
+
+
+class Stop(Exception):
+    pass
+
+
+def stop_after(collapses):
+    def progress(done, faces, max_error):
+        if done >= collapses:
+            raise Stop()
+    return progress
+
+
+def graph(kind, triangulation, points):
+    if kind == 'mesh':
+        return triangulation_to_mesh(triangulation, points)
+    return helpers.triangulation_to_graph(triangulation, points)
+
+
+@pytest.mark.parametrize('kind', ['mesh', 'networkx'])
+@pytest.mark.parametrize('quadrics', ['dict', 'packed32'])
+def test_resume_is_identical(tmp_path, kind, quadrics):
+    filename = os.path.join(BUNNY, 'bun_zipper_res4.ply')
+    points, triangulation = data.get_triangulation(filename)
+    stats = {}
+    expected = edge_contraction(graph(kind, triangulation, points), triangulation, points, target_ratio=0.2,
+                                quadrics=quadrics, stats=stats)
+
+    points, triangulation = data.get_triangulation(filename)
+    checkpoint = Checkpoint(str(tmp_path / 'run.npz'), every=100, seconds=None)
+    with pytest.raises(Stop):
+        edge_contraction(graph(kind, triangulation, points), triangulation, points, target_ratio=0.2,
+                         quadrics=quadrics, checkpoint=checkpoint, progress=stop_after(250), progress_every=50)
+    assert checkpoint.saves == 2
+
+    resumed_stats = {}
+    resumed = resume(checkpoint.filename, stats=resumed_stats)
+    assert resumed == expected
+    assert resumed_stats == stats
+
+    data.save_ply(str(tmp_path / 'expected.ply'), *expected)
+    data.save_ply(str(tmp_path / 'resumed.ply'), *resumed)
+    assert (tmp_path / 'expected.ply').read_bytes() == (tmp_path / 'resumed.ply').read_bytes()
@@ -0,0 +1,107 @@
+import os
+import struct
+
+import pytest
+
+import data
+from conftest import BUNNY
+from helpers import sorted_tuple
+
+HEADER = """ply
+format {format} 1.0
+element vertex {vertices}
+{vertex_properties}
+element face {faces}
+property list uchar int vertex_indices
+end_header
+"""
+XYZ = "property float x\nproperty float y\nproperty float z"
+
+
+def write(path, body, format='ascii', vertices=4, faces=2, vertex_properties=XYZ):
+    header = HEADER.format(format=format, vertices=vertices, faces=faces, vertex_properties=vertex_properties)
+    path.write_bytes(header.encode('ascii') + (body.encode('ascii') if isinstance(body, str) else body))
+    return str(path)
+
+
+def test_ascii_with_fewer_faces_than_declared(tmp_path):
+    filename = write(tmp_path / 'short.ply', "0 0 0\n1 0 0\n0 1 0\n0 0 1\n3 0 1 2\n", faces=3)
+    points, triangulation = data.get_triangulation(filename)
+    assert len(points) == 4
+    assert triangulation == [(0, 1, 2)]
+
+
+def test_extra_and_reordered_vertex_properties(tmp_path):
+    properties = "property float confidence\nproperty float z\nproperty uchar red\nproperty float x\nproperty float y"
+    body = "0.5 3 255 1 2\n0.5 6 0 4 5\n0.5 9 1 7 8\n3 0 1 2\n"
+    points, triangulation = data.get_triangulation(write(tmp_path / 'a.ply', body, vertices=3, faces=1,
+                                                         vertex_properties=properties))
+    assert points == [[1, 2, 3], [4, 5, 6], [7, 8, 9]]
+    assert triangulation == [(0, 1, 2)]
+
+    vertex = struct.pack('<fBfff', 3, 255, 1, 2, 0.5)
+    properties = "property float z\nproperty uchar red\nproperty float x\nproperty float y\nproperty float confidence"
+    body = vertex * 3 + struct.pack('<B3i', 3, 0, 1, 2)
+    points, _ = data.get_triangulation(write(tmp_path / 'b.ply', body, 'binary_little_endian', vertices=3, faces=1,
+                                             vertex_properties=properties))
+    assert points == [[1, 2, 3]] * 3
+
+
+def test_quads_are_split_into_fans(tmp_path):
+    body = "0 0 0\n1 0 0\n1 1 0\n0 1 0\n0 0 1\n4 0 1 2 3\n5 0 1 2 3 4\n"
+    _, triangulation = data.get_triangulation(write(tmp_path / 'quads.ply', body, vertices=5, faces=2))
+    assert triangulation == [(0, 1, 2), (0, 2, 3), (0, 3, 4)]
+
+
+def test_binary_lists_of_mixed_length(tmp_path):
+    points = [(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0)]
+    body = b''.join(struct.pack('>3f', *p) for p in points)
+    body += struct.pack('>B3i', 3, 0, 1, 2) + struct.pack('>B4i', 4, 0, 2, 3, 1) + struct.pack('>B2i', 2, 0, 3)
+    read_points, triangulation = data.get_triangulation(write(tmp_path / 'mixed.ply', body, 'binary_big_endian',
+                                                              faces=3))
+    assert read_points == [list(map(float, p)) for p in points]
+    assert triangulation == [(0, 1, 2), (0, 1, 3), (0, 2, 3)]
+
+
+def baseline_triangulation(file):
+    """ The reader of the first version, for the 5 values per vertex files of the bunny. """
+    points = []
+    triangulation = set()
+    with open(file, "r") as f:
+        line = f.readline()
+        while line != "end_header\n":
+            line = f.readline()
+        for line in f.readlines():
+            values = line.strip().split(" ")
+            if len(values) == 5:
+                points.append([float(x) for x in values[:3]])
+            elif len(values) == 4 and values[0] == '3':
+                triangulation.add(sorted_tuple(*[int(i) for i in values[1:]]))
+    return points, list(triangulation)
+
+
+@pytest.mark.parametrize('name', ['bun_zipper_res2', 'bun_zipper_res3', 'bun_zipper_res4'])
+def test_matches_baseline_reader(name):
+    filename = os.path.join(BUNNY, name + '.ply')
+    points, triangulation = data.get_triangulation(filename)
+    expected_points, expected_triangulation = baseline_triangulation(filename)
+    assert points == expected_points
+    assert triangulation == sorted(expected_triangulation)
+
+
+@pytest.mark.parametrize('format', ['ascii', 'binary_little_endian', 'binary_big_endian'])
+def test_write_read_round_trip(tmp_path, monkeypatch, format):
+    # small chunks, so the triangles are written in several blocks
+    monkeypatch.setattr(data, 'CHUNK_SIZE', 3)
+    points = [[0.5 * i, -0.25 * i, 1.0 + i] for i in range(8)]
+    triangulation = [(0, 1, 2), (1, 2, 3), (2, 3, 4), (3, 4, 5), (4, 5, 6), (5, 6, 7), (0, 6, 7)]
+    filename = str(tmp_path / 'round.ply')
+    data.save_ply(filename, triangulation, points, format)
+    assert data.ply_counts(filename) == (8, 7)
+    assert data.get_triangulation(filename) == (points, sorted(triangulation))
+
+
+def test_write_compact(tmp_path):
+    filename = str(tmp_path / 'compact.ply')
+    data.save_ply(filename, [(1, 3, 4)], [[i, 0.0, 0.0] for i in range(5)], 'binary_little_endian', compact=True)
+    assert data.get_triangulation(filename) == ([[1, 0, 0], [3, 0, 0], [4, 0, 0]], [(0, 1, 2)])
@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+import pytest
+
+import data, helpers
+from conftest import BUNNY
+from edge_contraction import edge_contraction, initial_quadric_arrays, is_safe, is_safe_by_links
+from helpers import error_triangle
+from link_condition import adjacency, safe_edges
+from mesh import triangulation_to_mesh
+
+
+@pytest.fixture(scope='module')
+def bunny():
+    points, triangulation = data.get_triangulation(os.path.join(BUNNY, 'bun_zipper_res4.ply'))
+    return list(points), list(triangulation)
+
+
+@pytest.mark.parametrize('quadrics', ['dict', 'packed'])
+def test_graph_backends_agree(bunny, quadrics):
+    points, triangulation = bunny
+    results = []
+    for graph in (triangulation_to_mesh(triangulation, points), helpers.triangulation_to_graph(triangulation, points)):
+        stats = {}
+        results.append((edge_contraction(graph, triangulation, list(points), target_ratio=0.2, quadrics=quadrics,
+                                         stats=stats), stats))
+    (mesh_result, mesh_stats), (graph_result, graph_stats) = results
+    assert mesh_result == graph_result
+    assert mesh_stats['collapses'] == graph_stats['collapses']
+
+
+def test_initial_quadric_arrays_match_error_triangle(bunny):
+    points, triangulation = bunny
+    vertex_q, edges, edge_q, face_q = initial_quadric_arrays(points, triangulation)
+
+    expected_vertex = np.zeros((len(points), 4, 4))
+    expected_edge = {}
+    for f, (a, b, c) in enumerate(triangulation):
+        q = error_triangle(a, b, c, points)
+        assert np.allclose(face_q[f], q, rtol=1e-9, atol=1e-15)
+        for x in (a, b, c):
+            expected_vertex[x] += q
+        for e in ((a, b), (b, c), (a, c)):
+            e = tuple(sorted(e))
+            expected_edge[e] = expected_edge.get(e, 0) + q
+
+    assert np.allclose(vertex_q, expected_vertex, rtol=1e-9, atol=1e-15)
+    assert sorted(expected_edge) == list(map(tuple, edges.tolist()))
+    assert np.allclose(edge_q, [expected_edge[e] for e in map(tuple, edges.tolist())], rtol=1e-9, atol=1e-15)
+
+
+def test_is_safe_matches_links_and_batch_check(bunny):
+    points, triangulation = bunny
+    graph = helpers.triangulation_to_graph(triangulation, points)
+    mesh = triangulation_to_mesh(triangulation, points)
+    all_edges = np.array(sorted(tuple(sorted(e)) for e in graph.edges()))
+    pairs = np.random.default_rng(0).integers(0, len(points), size=(2000, 2))
+    edges = np.concatenate([all_edges, pairs])
+
+    expected = [is_safe_by_links(graph, tuple(e)) for e in edges.tolist()]
+    assert 0 < sum(expected) < len(all_edges)
+    assert [is_safe(graph, tuple(e)) for e in edges.tolist()] == expected
+    assert [is_safe(mesh, tuple(e)) for e in edges.tolist()] == expected
+    assert safe_edges(*adjacency(all_edges, len(points)), edges).tolist() == expected
@@ -0,0 +1,44 @@
+from edge_queue import EdgeQueue
+
+
+def test_pops_by_error():
+    queue = EdgeQueue([(3.0, (0, 1)), (1.0, (1, 2)), (2.0, (0, 2))])
+    assert [queue.pop() for _ in range(3)] == [(1.0, (1, 2)), (2.0, (0, 2)), (3.0, (0, 1))]
+    assert queue.empty()
+
+
+def test_push_changes_error():
+    queue = EdgeQueue([(1.0, (0, 1)), (2.0, (1, 2))])
+    queue.push((0, 1), 3.0)
+    assert queue.pop() == (2.0, (1, 2))
+    assert queue.pop() == (3.0, (0, 1))
+    assert queue.empty()
+
+
+def test_push_after_remove():
+    queue = EdgeQueue()
+    queue.push((0, 1), 1.0)
+    queue.remove((0, 1))
+    queue.push((0, 1), 5.0)
+    assert len(queue) == 1
+    assert queue.pop() == (5.0, (0, 1))
+    assert queue.empty()
+
+
+def test_push_after_pop():
+    queue = EdgeQueue([(1.0, (0, 1)), (2.0, (1, 2))])
+    queue.push((0, 1), 0.5)
+    assert queue.pop() == (0.5, (0, 1))
+    queue.push((0, 1), 4.0)
+    assert queue.pop() == (2.0, (1, 2))
+    assert queue.pop() == (4.0, (0, 1))
+    assert queue.empty()
+
+
+def test_arrays_round_trip():
+    queue = EdgeQueue([(1.0, (0, 1)), (2.0, (1, 2))])
+    queue.remove((0, 1))
+    queue.push((0, 1), 3.0)
+    restored = EdgeQueue.from_arrays(queue.arrays())
+    restored.push((2, 3), 2.5)
+    assert [restored.pop() for _ in range(3)] == [(2.0, (1, 2)), (2.5, (2, 3)), (3.0, (0, 1))]
@@ -0,0 +1,67 @@
+import numpy as np
+
+from helpers import c_coordinates, compact_vertices, error_triangle, quadric_errors
+
+
+def test_c_coordinates_solves_regular_system():
+    # three planes through (1, 2, 3) with independent normals
+    points = np.array([[1., 2., 3.], [0., 0., 0.], [1., 0., 0.], [0., 1., 0.], [0., 0., 1.]])
+    planes = [np.array([1., 0., 0., -1.]), np.array([0., 1., 0., -2.]), np.array([0., 0., 1., -3.])]
+    q = np.zeros((len(points), 4, 4))
+    q[1] = np.outer(planes[0], planes[0]) + np.outer(planes[1], planes[1])
+    q[2] = np.outer(planes[2], planes[2])
+
+    c, errors = c_coordinates([(1, 2)], q, points)
+    assert np.allclose(c, [[1., 2., 3.]])
+    assert np.allclose(errors, [0.])
+
+
+def test_c_coordinates_falls_back_for_singular_system():
+    # both endpoints see the same single plane z = 0, so every point of the plane is optimal
+    points = np.array([[0., 0., 0.], [1., 0., 0.], [0., 1., 0.], [0., 0., 2.], [2., 0., 1.]])
+    q = np.array([error_triangle(0, 1, 2, points)] * len(points))
+
+    c, errors = c_coordinates([(0, 1), (3, 4), (0, 3)], q, points)
+    # (0, 1) lies in the plane, so the first candidate, endpoint a, is kept
+    assert np.allclose(c[0], points[0])
+    # (3, 4): endpoint b is closest to the plane, (0, 3): endpoint a is on the plane
+    assert np.allclose(c[1], points[4])
+    assert np.allclose(c[2], points[0])
+    assert np.allclose(errors, quadric_errors(q[[0, 3, 0]] + q[[1, 4, 3]], c))
+
+
+def test_c_coordinates_falls_back_to_midpoint():
+    # quadric of the plane x = 1 between two points on opposite sides of it
+    points = np.array([[0., 0., 0.], [2., 0., 0.]])
+    plane = np.array([1., 0., 0., -1.])
+    q = np.array([np.outer(plane, plane)] * 2)
+
+    c, errors = c_coordinates([(0, 1)], q, points)
+    assert np.allclose(c, [[1., 0., 0.]])
+    assert np.allclose(errors, [0.])
+
+
+def test_c_coordinates_with_zero_quadrics():
+    points = np.array([[0., 0., 0.], [1., 1., 1.]])
+    c, errors = c_coordinates([(0, 1)], np.zeros((2, 4, 4)), points)
+    assert np.allclose(c, [points[0]])
+    assert np.allclose(errors, [0.])
+
+
+def test_compact_vertices():
+    points = np.arange(18, dtype=float).reshape(6, 3)
+    triangulation = [(1, 3, 4), (4, 3, 5)]
+
+    faces, kept, mapping = compact_vertices(triangulation, points)
+    assert mapping.tolist() == [-1, 0, -1, 1, 2, 3]
+    assert faces.tolist() == [[0, 1, 2], [2, 1, 3]]
+    assert np.array_equal(kept, points[[1, 3, 4, 5]])
+    assert np.array_equal(kept[faces], points[np.array(triangulation)])
+
+
+def test_compact_vertices_keeps_used_points():
+    points = np.random.default_rng(0).random((4, 3))
+    faces, kept, mapping = compact_vertices([(0, 1, 2), (0, 2, 3)], points)
+    assert mapping.tolist() == [0, 1, 2, 3]
+    assert faces.tolist() == [[0, 1, 2], [0, 2, 3]]
+    assert np.array_equal(kept, points)
@@ -0,0 +1,21 @@
+import os
+
+import numpy as np
+
+import data
+from conftest import BUNNY
+from edge_contraction import edge_contraction
+from mesh import triangulation_to_mesh
+
+
+def test_corners_after_contraction():
+    points, triangulation = data.get_triangulation(os.path.join(BUNNY, 'bun_zipper_res4.ply'))
+    mesh = triangulation_to_mesh(triangulation, points)
+    edge_contraction(mesh, triangulation, points, target_ratio=0.3)
+
+    faces = mesh.faces[mesh.faces[:, 0] >= 0]
+    valence = np.bincount(faces.ravel(), minlength=mesh.size)
+    assert np.array_equal(mesh.valence[:mesh.size], valence)
+    for v in np.flatnonzero(valence):
+        assert mesh.faces.ravel()[mesh.corner[v]] == v
+        assert sorted(mesh.star(v)) == np.flatnonzero((mesh.faces == v).any(axis=1)).tolist()
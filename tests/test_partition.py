@@ -0,0 +1,44 @@
+import os
+
+import numpy as np
+
+import data
+from conftest import BUNNY
+from edge_contraction import vertex_quadric_array
+from partition import cell_job, face_cells, seam_vertices, simplify_cell, simplify_partitioned, stitch
+from simplify import simplify
+from topology import invariants
+
+
+def test_stitch_without_contractions():
+    points, triangulation = data.get_triangulation(os.path.join(BUNNY, 'bun_zipper_res4.ply'))
+    points, faces = np.asarray(points), np.asarray(triangulation)
+    cell = face_cells(points, faces, 2)
+    locked = seam_vertices(faces, cell, len(points))
+
+    results = []
+    for k in np.unique(cell):
+        cell_faces = faces[cell == k]
+        used = np.unique(cell_faces)
+        job = cell_job(cell_faces, points, locked)
+        results.append((used[locked[used]], simplify_cell(*job, {'target_faces': len(cell_faces)})))
+    stitched, stitched_points, vertex_q = stitch(results, points, locked)
+
+    # the same triangles and the quadric of every vertex summed over all its triangles, also on the seams
+    corners = stitched_points[stitched]
+    assert sorted(map(tuple, corners.reshape(len(corners), -1).tolist())) == \
+        sorted(map(tuple, points[faces].reshape(len(faces), -1).tolist()))
+    expected = vertex_quadric_array(points, faces)
+    for v, point in enumerate(stitched_points):
+        original = np.flatnonzero((points == point).all(axis=1))[0]
+        assert np.allclose(vertex_q[v], expected[original], rtol=1e-9, atol=1e-15)
+
+
+def test_topology_like_sequential():
+    filename = os.path.join(BUNNY, 'bun_zipper_res2.ply')
+    points, triangulation = data.get_triangulation(filename)
+    expected = invariants(simplify(filename, target=0.1)[0])
+    result = invariants(simplify_partitioned(triangulation, points, workers=2, target_ratio=0.1)[0])
+    assert result['faces'] == expected['faces']
+    assert result['components'] == expected['components']
+    assert result['euler'] == expected['euler']
@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+import pytest
+
+import data
+from conftest import BUNNY
+from edge_contraction import edge_contraction, initial_arrays, initial_quadric_arrays, vertex_quadric_array
+from mesh import triangulation_to_mesh
+from quadrics import VertexQuadrics, pack, unpack
+
+
+@pytest.fixture(scope='module')
+def bunny():
+    points, triangulation = data.get_triangulation(os.path.join(BUNNY, 'bun_zipper_res4.ply'))
+    return list(points), list(triangulation)
+
+
+def simplify(bunny, quadrics, **targets):
+    points, triangulation = list(bunny[0]), bunny[1]
+    stats = {}
+    result = edge_contraction(triangulation_to_mesh(triangulation, points), triangulation, points,
+                              quadrics=quadrics, stats=stats, **targets)
+    return result, stats
+
+
+def test_pack_round_trip():
+    q = np.random.default_rng(0).normal(size=(5, 4, 4))
+    q = q + q.transpose(0, 2, 1)
+    assert np.array_equal(unpack(pack(q)), q)
+    assert np.array_equal(VertexQuadrics(q).get([4, 0]), q[[4, 0]])
+
+
+def test_packed_initial_arrays_match_dict(bunny):
+    points, triangulation = bunny
+    vertex_q = initial_quadric_arrays(points, triangulation)[0]
+    assert np.array_equal(vertex_quadric_array(points, triangulation), pack(vertex_q))
+
+    full, packed = initial_arrays(points, triangulation), initial_arrays(points, triangulation, packed=True)
+    assert set(packed) == {'vertex_q_packed', 'edges', 'positions', 'errors'}
+    for name in ('edges', 'positions', 'errors'):
+        assert np.array_equal(packed[name], full[name])
+
+
+def test_packed_matches_dict_until_edges_move(bunny):
+    # the first contractions only use quadrics of edges made from the current triangles, like the packed modes
+    target = len(bunny[1]) - 40
+    assert simplify(bunny, 'packed', target_faces=target)[0] == simplify(bunny, 'dict', target_faces=target)[0]
+
+
+@pytest.mark.parametrize('quadrics', ['packed', 'packed32'])
+def test_packed_differs_from_dict_only_in_order(bunny, quadrics):
+    # Qab from the current triangles of the edge contracts other edges later on, with errors of the same size
+    (triangles, _), stats = simplify(bunny, quadrics, target_ratio=0.2)
+    (expected, _), expected_stats = simplify(bunny, 'dict', target_ratio=0.2)
+    assert len(triangles) == len(expected)
+    assert stats['collapses'] == expected_stats['collapses']
+    assert stats['max_error'] == pytest.approx(expected_stats['max_error'], rel=0.2)
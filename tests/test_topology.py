@@ -0,0 +1,108 @@
+import os
+
+import numpy as np
+import pytest
+
+import data
+from conftest import BUNNY
+from edge_contraction import edge_contraction
+from mesh import triangulation_to_mesh
+from topology import TopologyChanged, TopologyTracker, invariants
+
+
+def octahedron():
+    points = [(1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0), (0, 0, 1), (0, 0, -1)]
+    triangles = [(x, y, z) for x in (0, 1) for y in (2, 3) for z in (4, 5)]
+    return np.array(points, dtype=float), triangles
+
+
+def torus(n=12, m=8, radius=3., tube=1.):
+    """ n x m grid wrapped around both axes. """
+    u, v = np.meshgrid(np.arange(n) * 2 * np.pi / n, np.arange(m) * 2 * np.pi / m, indexing='ij')
+    points = np.stack([(radius + tube * np.cos(v)) * np.cos(u), (radius + tube * np.cos(v)) * np.sin(u),
+                       tube * np.sin(v)], axis=-1).reshape(-1, 3)
+    triangles = []
+    for i in range(n):
+        for j in range(m):
+            a, b, c, d = i * m + j, ((i + 1) % n) * m + j, ((i + 1) % n) * m + (j + 1) % m, i * m + (j + 1) % m
+            triangles += [(a, b, c), (a, c, d)]
+    return points, triangles
+
+
+def disk(n=6):
+    """ n x n grid of squares in the plane. """
+    x, y = np.meshgrid(np.arange(n + 1), np.arange(n + 1), indexing='ij')
+    points = np.stack([x, y, np.zeros_like(x)], axis=-1).reshape(-1, 3).astype(float)
+    triangles = []
+    for i in range(n):
+        for j in range(n):
+            a, b, c, d = i * (n + 1) + j, (i + 1) * (n + 1) + j, (i + 1) * (n + 1) + j + 1, i * (n + 1) + j + 1
+            triangles += [(a, b, c), (a, c, d)]
+    return points, triangles
+
+
+@pytest.mark.parametrize('surface, expected', [
+    (octahedron, {'vertices': 6, 'edges': 12, 'faces': 8, 'euler': 2, 'components': 1, 'boundary_loops': 0,
+                  'genus': 0}),
+    (torus, {'vertices': 96, 'edges': 288, 'faces': 192, 'euler': 0, 'components': 1, 'boundary_loops': 0,
+             'genus': 1}),
+    (disk, {'vertices': 49, 'edges': 120, 'faces': 72, 'euler': 1, 'components': 1, 'boundary_loops': 1,
+            'genus': 0}),
+])
+def test_invariants(surface, expected):
+    assert invariants(surface()[1]) == expected
+
+
+def test_invariants_of_two_components():
+    _, triangles = octahedron()
+    _, disk_triangles = disk(2)
+    triangles += [tuple(x + 6 for x in t) for t in disk_triangles]
+    counts = invariants(triangles)
+    assert counts['euler'] == 3
+    assert counts['components'] == 2
+    assert counts['boundary_loops'] == 1
+    assert counts['genus'] == 0
+
+
+class CheckedTracker(TopologyTracker):
+    """ Compares the counts of the tracker with invariants of the current triangles after every contraction. """
+
+    def start(self, triangles):
+        self.triangles = set(map(tuple, np.sort(np.asarray(triangles).reshape(-1, 3), axis=1).tolist()))
+        self.changed = 0
+        super().start(triangles)
+        self.check()
+
+    def collapse(self, edge, removed, added):
+        self.triangles -= set(removed['triangles'])
+        self.triangles |= set(added['triangles'])
+        try:
+            super().collapse(edge, removed, added)
+        except TopologyChanged:
+            self.changed += 1
+            self.euler = self.vertices - self.edges + self.faces
+        self.check()
+
+    def check(self):
+        counts = invariants(list(self.triangles)) if self.triangles else {'vertices': 0, 'edges': 0, 'faces': 0}
+        assert (self.vertices, self.edges, self.faces) == (counts['vertices'], counts['edges'], counts['faces'])
+
+
+@pytest.mark.parametrize('surface', [octahedron, torus, disk])
+@pytest.mark.parametrize('quadrics', ['dict', 'packed'])
+def test_tracker_follows_invariants(surface, quadrics):
+    points, triangles = surface()
+    tracker = CheckedTracker()
+    edge_contraction(triangulation_to_mesh(triangles, points), triangles, points.tolist(), target_faces=4,
+                     quadrics=quadrics, topology=tracker)
+    assert tracker.collapses > 0
+    if surface is not disk:
+        assert tracker.changed == 0
+
+
+def test_tracker_follows_invariants_on_bunny():
+    points, triangles = data.get_triangulation(os.path.join(BUNNY, 'bun_zipper_res4.ply'))
+    points, triangles = list(points), list(triangles)
+    tracker = CheckedTracker()
+    edge_contraction(triangulation_to_mesh(triangles, points), triangles, points, target_ratio=0.1, topology=tracker)
+    assert tracker.collapses > 0
@@ -0,0 +1,128 @@
+"""
+    Cheap topology checks of triangulations.
+
+    The Euler characteristic, the number of connected components and the number of boundary loops are computed from
+    the (F, 3) array of triangles with a few array passes, so they can be compared before and after simplification
+    at a small fraction of the cost of helpers.homology (gudhi persistence), which stays the deep check.
+
+    On a surface, a contraction that passes is_safe removes one vertex, three edges and two triangles, so the Euler
+    characteristic does not change. is_safe only looks at the graph, so on triangulations with edges of more than two
+    triangles it can change. TopologyTracker follows the counts through the contractions of edge_contraction and
+    fails at the first contraction that changes the Euler characteristic.
+"""
+import numpy as np
+
+
+def invariants(triangulation):
+    """ Dict with the numbers of vertices, edges and triangles, Euler characteristic, connected components, boundary
+        loops and genus (summed over components, for orientable surfaces) of the triangulation (list or array of
+        triangles). """
+    faces = np.unique(np.sort(np.asarray(triangulation, dtype=np.int64).reshape(-1, 3), axis=1), axis=0)
+    vertices, faces = np.unique(faces, return_inverse=True)
+    faces = faces.reshape(-1, 3)
+    n = len(vertices)
+
+    face_edges = np.sort(faces[:, [0, 1, 1, 2, 0, 2]].reshape(-1, 2), axis=1)
+    keys, counts = np.unique(face_edges[:, 0] * n + face_edges[:, 1], return_counts=True)
+    boundary = keys[counts == 1]
+    boundary_vertices, boundary_edges = np.unique(np.stack([boundary // n, boundary % n], axis=1),
+                                                  return_inverse=True)
+
+    euler = n - len(keys) + len(faces)
+    components = count_components(faces[:, [0, 1, 1, 2]].reshape(-1, 2), n)
+    loops = count_components(boundary_edges.reshape(-1, 2), len(boundary_vertices))
+    return {
+        'vertices': n,
+        'edges': len(keys),
+        'faces': len(faces),
+        'euler': euler,
+        'components': components,
+        'boundary_loops': loops,
+        'genus': (2 * components - loops - euler) // 2,
+    }
+
+
+def same_topology(before, after):
+    """ Check that two dicts of invariants have the same Euler characteristic, components and boundary loops. """
+    return all(before[key] == after[key] for key in ('euler', 'components', 'boundary_loops'))
+
+
+def count_components(edges, n):
+    """ Number of connected components of the graph with vertices 0 .. n-1 and (E, 2) array of edges. Union-find over
+        all edges at once: roots of the endpoints of every edge are linked to the smaller one, then paths are
+        compressed, until the endpoints of every edge have the same root. """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    u, v = edges[:, 0], edges[:, 1]
+    parent = np.arange(n)
+    while True:
+        ru, rv = parent[u], parent[v]
+        different = ru != rv
+        if not different.any():
+            break
+        np.minimum.at(parent, np.maximum(ru, rv)[different], np.minimum(ru, rv)[different])
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+    return int(np.count_nonzero(parent == np.arange(n)))
+
+
+class TopologyChanged(Exception):
+    pass
+
+
+class TopologyTracker:
+    """ Follows the numbers of vertices, edges and triangles of the triangulation through the contractions of
+        edge_contraction (see its 'topology' argument) and raises TopologyChanged at the first contraction that changes
+        the Euler characteristic. Only vertices and edges of triangles are counted, like in invariants.
+
+        A contraction of (a, b) into c only changes the triangles around a and b, and the only edges that can appear
+        or disappear are the edges at a, b and c, so the change is counted on these triangles. The number of triangles
+        around every vertex is kept to see when a vertex of the link loses its last triangle. """
+
+    def __init__(self):
+        self.vertex_faces = {}
+        self.vertices = self.edges = self.faces = 0
+        self.euler = None
+        self.collapses = 0
+
+    def start(self, triangles):
+        """ Called with the triangles (sorted tuples) before the first contraction. """
+        triangles = list(triangles)
+        counts = invariants(triangles) if triangles else {'vertices': 0, 'edges': 0, 'faces': 0}
+        self.vertices, self.edges, self.faces = counts['vertices'], counts['edges'], counts['faces']
+        self.euler = self.vertices - self.edges + self.faces
+        for t in set(triangles):
+            for x in t:
+                self.vertex_faces[x] = self.vertex_faces.get(x, 0) + 1
+
+    def collapse(self, edge, removed, added):
+        """ Called after every contraction with the simplices removed and added by contract. All removed triangles
+            are triangles of the triangulation. """
+        removed_triangles, added_triangles = set(removed['triangles']), set(added['triangles'])
+        a, b = edge
+        c = added['nodes'][0]
+        self.edges -= len({e for t in removed_triangles for e in ((t[0], t[1]), (t[1], t[2]), (t[0], t[2]))
+                           if a in e or b in e})
+        self.edges += len({e for t in added_triangles for e in ((t[0], t[1]), (t[1], t[2]), (t[0], t[2])) if c in e})
+        self.faces += len(added_triangles) - len(removed_triangles)
+
+        vertex_faces = self.vertex_faces
+        for t in removed_triangles:
+            for x in t:
+                vertex_faces[x] -= 1
+        for t in added_triangles:
+            for x in t:
+                vertex_faces[x] = vertex_faces.get(x, 0) + 1
+        for t in removed_triangles:
+            for x in t:
+                if vertex_faces.get(x) == 0:
+                    del vertex_faces[x]
+                    self.vertices -= 1
+        self.vertices += c in vertex_faces
+
+        self.collapses += 1
+        if self.vertices - self.edges + self.faces != self.euler:
+            raise TopologyChanged("Contraction {} of edge {} changed the Euler characteristic from {} to {}.".format(
+                self.collapses, edge, self.euler, self.vertices - self.edges + self.faces))